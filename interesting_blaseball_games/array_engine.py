@@ -0,0 +1,187 @@
+import numpy as np
+from .cache import GamesCache
+from .columns import needed_columns
+from .explain import NO_EXPLAIN
+from .reasons import select_reasons, reason_masks, check_reason_columns
+from .util import ranked_rows
+
+
+class ArrayTable(object):
+    """
+    Compact table of equal-length NumPy columns. Implements the small
+    part of the pandas DataFrame interface that GameData and the views
+    use: table[column] (an array), table[list of columns],
+    table[start:stop], len(table), and .columns; plus take(positions).
+    """
+    __slots__ = ('columns', 'data', 'nrows')
+
+    def __init__(self, data, columns=None, nrows=None):
+        self.columns = list(data.keys()) if columns is None else list(columns)
+        self.data = data
+        if nrows is None:
+            nrows = len(data[self.columns[0]]) if self.columns else 0
+        self.nrows = nrows
+
+    @classmethod
+    def from_frame(cls, df):
+        """Make a table from a pandas data frame"""
+        return cls(dict((c, df[c].to_numpy()) for c in df.columns), list(df.columns), len(df))
+
+    def to_frame(self):
+        """Make a pandas data frame from the table"""
+        import pandas as pd
+        return pd.DataFrame(self.data, columns=self.columns)
+
+    def __len__(self):
+        return self.nrows
+
+    def __getitem__(self, key):
+        if isinstance(key, str):
+            return self.data[key]
+        if isinstance(key, list):
+            return ArrayTable(dict((c, self.data[c]) for c in key), key, self.nrows)
+        if isinstance(key, slice):
+            start, stop, step = key.indices(self.nrows)
+            return ArrayTable(dict((c, v[key]) for c, v in self.data.items()), self.columns, len(range(start, stop, step)))
+        raise TypeError("ArrayTable indices must be column names, lists of column names, or slices")
+
+    def take(self, positions):
+        """Get the rows at the given positions (in that order)"""
+        return ArrayTable(dict((c, v[positions]) for c, v in self.data.items()), self.columns, len(positions))
+
+
+def sort_key(values, ascending):
+    """
+    Turn a column into a key that np.lexsort sorts in the given
+    direction, with missing values last (like pandas sort_values)
+    """
+    kind = values.dtype.kind
+    if kind in 'biu':
+        key = values.astype(np.int64)
+    elif kind == 'f':
+        key = values.astype(np.float64)
+    else:
+        # Strings sort by their rank
+        _, key = np.unique(np.asarray(values).astype(str), return_inverse=True)
+        key = key.reshape(-1).astype(np.int64)
+    return key if ascending else -key
+
+
+def sort_positions(table, by, ascending, n=None, rows=None):
+    """
+    Get the positions of the rows (of all rows, or of the positions in
+    rows) sorted on the keys in by, keeping the first n (or all, if n
+    is None). The sort is stable, so the result is the same as the
+    pandas path (see sort_top in game_data.py), and like sort_top it
+    only sorts the rows whose first key ties with or beats the n-th best.
+    """
+    if rows is None:
+        rows = np.arange(len(table))
+    if n is not None and n <= 0:
+        return rows[:0]
+    keys = [sort_key(np.asarray(table[c])[rows], a) for c, a in zip(by, ascending)]
+    if n is not None and n < len(rows):
+        first = keys[0]
+        present = first[~np.isnan(first)] if first.dtype.kind == 'f' else first
+        if len(present) >= n:
+            candidates = np.flatnonzero(first <= np.partition(present, n-1)[n-1])
+            keys = [k[candidates] for k in keys]
+            rows = rows[candidates]
+    # np.lexsort sorts on the last key first
+    order = np.lexsort(keys[::-1])
+    return rows[order] if n is None else rows[order[:n]]
+
+
+class ArrayGameData(object):
+    """
+    GameData backend built on ArrayTable instead of pandas
+    (--engine numpy), with the same filters and reasons as GameData:
+    filters are NumPy masks and index lookups, and reasons are ranked
+    with np.lexsort. Reading the cache does not import pandas (building
+    the cache the first time, and --no-cache, still use the pandas loader).
+    """
+    def __init__(self, options, explain=NO_EXPLAIN, columns=None):
+        """
+        Load the data set into self.df (an ArrayTable). If columns is
+        given, only the columns needed to display those columns are loaded.
+        """
+        # Reasons to evaluate (built-in, or from the reasons file)
+        self.reasons = select_reasons(options.reason, options.reasons_file)
+        columns = needed_columns(columns, self.reasons)
+
+        # Save options
+        self.options = options
+        self.explain = explain
+        self.team_rows = None
+
+        if options.no_cache:
+            # Stream the game data, applying every filter while parsing
+            from .game_data import stream_games_frame
+            df = stream_games_frame(options.season, options.postseason, options.team, columns, explain=explain)
+            self.df = ArrayTable.from_frame(df)
+        else:
+            # Only the requested seasons are loaded
+            seasons = None if 'all' in options.season else [int(s)-1 for s in options.season]
+            with explain.stage("load: cache (numpy)") as record:
+                cache = GamesCache(options.cache_dir)
+                arrays = cache.load_arrays(columns, seasons)
+                if arrays is not None:
+                    self.df = ArrayTable(arrays[1], arrays[0])
+                    self.team_rows = cache.load_team_rows()
+                    record['rows'] = len(self.df)
+                    if cache.damaged:
+                        # load_games_frame repairs the cache
+                        arrays = None
+            if arrays is None:
+                # Build the cache the first time
+                from .game_data import load_games_frame
+                df, self.team_rows = load_games_frame(options.cache_dir, explain=explain, columns=columns,
+                                                      with_team_rows=True, seasons=seasons)
+                self.df = ArrayTable.from_frame(df)
+
+            # Fiter data based on user configuration
+            with explain.stage("team") as record:
+                self.df = self._team_filter(options.team)
+                record['rows'] = len(self.df)
+            with explain.stage("postseason") as record:
+                self.df = self._postseason_filter(options.postseason)
+                record['rows'] = len(self.df)
+
+        check_reason_columns(self.df, self.reasons)
+
+    def _team_filter(self, teams):
+        """Filter game data on team(s), with the team index if there is one"""
+        if self.team_rows is not None and self.team_rows.nrows == len(self.df):
+            if self.team_rows.covers(teams):
+                return self.df
+            return self.df.take(self.team_rows.lookup(teams))
+        mask = np.isin(self.df['homeTeamNickname'], teams) | np.isin(self.df['awayTeamNickname'], teams)
+        return self.df.take(np.flatnonzero(mask))
+
+    def _postseason_filter(self, postseason):
+        """Filter game data to postseason games only"""
+        if not postseason:
+            return self.df
+        return self.df.take(np.flatnonzero(np.asarray(self.df['isPostseason'] == True, dtype=bool)))
+
+    def parse(self):
+        """
+        Find the interesting games for each reason, limited to
+        the number of rows the views will show. The tables are
+        computed lazily, one reason at a time (like GameData.parse).
+
+        Yields:
+        Tuples (string reason, ArrayTable table data)
+        """
+        n = ranked_rows(self.options)
+        with self.explain.stage("reason masks") as record:
+            masks = reason_masks(self.df, self.reasons)
+            record['rows'] = len(self.df)
+        for reason in self.reasons:
+            with self.explain.stage("reason: %s"%(reason.name)) as record:
+                mask = masks.pop(reason.name)
+                rows = None if mask is None else np.flatnonzero(mask)
+                positions = sort_positions(self.df, reason.by, reason.ascending, n, rows)
+                table = (reason.name, self.df.take(positions))
+                record['rows'] = len(positions)
+            yield table
@@ -0,0 +1,155 @@
+import os
+import sys
+import json
+import time
+import multiprocessing
+from .command import get_parser, process_options, QueryParser, QueryError, QUERY_KEYS, FLAG_KEYS
+from .game_data import GameData, load_games_frame
+from .view import MarkdownView
+from .output import atomic_output, check_output_file
+
+
+# Keys a query spec accepts besides QUERY_KEYS (see command.py),
+# that control where and how each result is written
+SPEC_OUTPUT_KEYS = ['name', 'output', 'format', 'markdown']
+
+FORMAT_EXTENSIONS = {'markdown': '.md', 'json': '.json'}
+
+# The (unfiltered) games data frame and its team index, loaded once before the worker
+# processes are forked, so they all share it
+_games = None
+_team_rows = None
+
+
+def read_specs(path):
+    """
+    Read a file of query specs: either a JSON list of objects,
+    or one JSON object per line (blank lines and lines starting
+    with # are skipped). Returns: list of dicts
+    """
+    with open(path, 'r') as f:
+        text = f.read()
+    try:
+        if text.lstrip().startswith('['):
+            specs = json.loads(text)
+        else:
+            specs = []
+            for line in text.splitlines():
+                line = line.strip()
+                if line and not line.startswith('#'):
+                    specs.append(json.loads(line))
+    except ValueError as e:
+        raise Exception("Error: could not parse query specs in %s: %s"%(path, e))
+    for i, spec in enumerate(specs):
+        if not isinstance(spec, dict):
+            raise Exception("Error: query %d in %s is not a JSON object"%(i+1, path))
+    return specs
+
+
+def spec_to_args(spec):
+    """
+    Turn a query spec (dict of config file keys to a value
+    or a list of values) into a list of command line arguments
+    """
+    args = []
+    for key, values in spec.items():
+        if key in SPEC_OUTPUT_KEYS:
+            continue
+        if key not in QUERY_KEYS:
+            raise QueryError("unrecognized key: %s (valid keys: %s)"%(key, ", ".join(QUERY_KEYS + SPEC_OUTPUT_KEYS)))
+        if not isinstance(values, list):
+            values = [values]
+        for value in values:
+            if key in FLAG_KEYS:
+                if value is True or str(value).lower() in ['', 'true', 'yes', '1']:
+                    args.append('--' + key)
+            else:
+                args += ['--' + key, str(value)]
+    return args
+
+
+def make_jobs(specs, if_exists='overwrite', reasons_file=None):
+    """
+    Check every query spec, and turn them into jobs for the worker processes.
+    Queries can use the reasons defined in reasons_file.
+    Returns: list of tuples (query number, list of args, output file, format, if_exists policy)
+    """
+    jobs = []
+    for i, spec in enumerate(specs):
+        fmt = spec.get('format', 'markdown')
+        if fmt not in FORMAT_EXTENSIONS:
+            raise Exception("Error: query %d: format must be one of: %s"%(i+1, ", ".join(FORMAT_EXTENSIONS.keys())))
+        output = spec.get('output') or "%s%s"%(spec.get('name', "query-%d"%(i+1)), FORMAT_EXTENSIONS[fmt])
+        try:
+            check_output_file(output, if_exists)
+            args = spec_to_args(spec)
+            if reasons_file:
+                args += ['--reasons-file', reasons_file]
+            process_options(get_parser(QueryParser).parse_args(args))
+        except Exception as e:
+            raise Exception("Error: query %d: %s"%(i+1, str(e).replace("Error: ", "")))
+        jobs.append((i+1, args, output, fmt, if_exists))
+    return jobs
+
+
+def _init_worker(cache_dir, use_cache):
+    """Load the games data frame, unless it was inherited from the parent process"""
+    global _games, _team_rows
+    if _games is None:
+        _games, _team_rows = load_games_frame(cache_dir, use_cache, with_team_rows=True)
+
+
+def run_job(job):
+    """
+    Run one query against the shared games data frame and write its output.
+    Returns: tuple (query number, output file, seconds, error message or None)
+    """
+    number, args, output, fmt, if_exists = job
+    t0 = time.perf_counter()
+    try:
+        options = process_options(get_parser(QueryParser).parse_args(args))
+        view = MarkdownView(options, GameData(options, _games, team_rows=_team_rows))
+        if fmt == 'json':
+            text = json.dumps(view.table_data())
+        else:
+            text = view.to_markdown()
+        with atomic_output(output, if_exists) as f:
+            f.write(text)
+    except Exception as e:
+        return (number, output, time.perf_counter() - t0, str(e))
+    return (number, output, time.perf_counter() - t0, None)
+
+
+def run_batch(options):
+    """
+    Run every query in the spec file options.batch: load the game data
+    once, then evaluate the queries in a pool of worker processes that
+    share it, writing each result to its own output file.
+    Returns: number of queries that failed
+    """
+    global _games, _team_rows
+    jobs = make_jobs(read_specs(options.batch), options.if_exists, options.reasons_file)
+    if len(jobs)==0:
+        return 0
+
+    t0 = time.perf_counter()
+    use_cache = not options.no_cache
+    _games, _team_rows = load_games_frame(options.cache_dir, use_cache, with_team_rows=True)
+    workers = min(options.workers or os.cpu_count() or 1, len(jobs))
+
+    # Forked workers share the parent's games data frame (copy-on-write),
+    # otherwise each worker loads it once (memory-mapped from the cache)
+    methods = multiprocessing.get_all_start_methods()
+    context = multiprocessing.get_context('fork' if 'fork' in methods else None)
+    failed = 0
+    with context.Pool(workers, initializer=_init_worker, initargs=(options.cache_dir, use_cache)) as pool:
+        for number, output, seconds, error in pool.imap_unordered(run_job, jobs):
+            if error is None:
+                print("Query %d: wrote %s (%.3f s)"%(number, output, seconds), file=sys.stderr)
+            else:
+                failed += 1
+                print("Query %d: FAILED: %s"%(number, error), file=sys.stderr)
+
+    elapsed = time.perf_counter() - t0
+    print("Ran %d queries in %.2f s with %d workers (%.1f queries/s)"%(len(jobs), elapsed, workers, len(jobs)/elapsed), file=sys.stderr)
+    return failed
@@ -0,0 +1,363 @@
+import os
+import json
+import shutil
+import hashlib
+import tempfile
+import numpy as np
+import blaseball_core_game_data as gd
+from . import _program
+from .datasource import get_refreshed_version
+from .team_rows import TeamRows
+
+
+# Bump this whenever the on-disk layout changes,
+# so that old caches are invalidated automatically
+CACHE_FORMAT_VERSION = 5
+
+CACHE_DIR_ENV = "INTERESTING_BLASEBALL_GAMES_CACHE"
+
+MANIFEST = "manifest.json"
+
+# Files holding the inverted team index
+TEAM_POSITIONS = "team_positions.npy"
+TEAM_OFFSETS = "team_offsets.npy"
+
+
+def get_cache_dir(cache_dir=None):
+    """
+    Get the directory holding the on-disk game data cache.
+    Precedence: explicit argument, environment variable,
+    $XDG_CACHE_HOME, ~/.cache
+    """
+    if cache_dir:
+        return os.path.abspath(cache_dir)
+    if os.environ.get(CACHE_DIR_ENV):
+        return os.path.abspath(os.environ[CACHE_DIR_ENV])
+    xdg = os.environ.get("XDG_CACHE_HOME", os.path.join(os.path.expanduser("~"), ".cache"))
+    return os.path.abspath(os.path.join(xdg, _program))
+
+
+def get_data_version():
+    """
+    Get a string identifying the version of the game data: the
+    installed blaseball_core_game_data distribution version plus a
+    fingerprint (name, size, mtime) of the package files, and the content
+    hashes of any refreshed data files (see refresh.py). Reinstalling or
+    upgrading the package, or refreshing the data, changes the fingerprint.
+    """
+    try:
+        from importlib.metadata import version
+        dist_version = version("blaseball-core-game-data")
+    except Exception:
+        dist_version = getattr(gd, "__version__", "unknown")
+
+    h = hashlib.sha256()
+    h.update(dist_version.encode('utf-8'))
+    pkg_dir = os.path.dirname(os.path.abspath(gd.__file__))
+    for dirpath, dirnames, filenames in os.walk(pkg_dir):
+        dirnames[:] = sorted(d for d in dirnames if d != '__pycache__')
+        for filename in sorted(filenames):
+            st = os.stat(os.path.join(dirpath, filename))
+            relpath = os.path.relpath(os.path.join(dirpath, filename), pkg_dir)
+            h.update(("%s:%d:%d;"%(relpath, st.st_size, st.st_mtime_ns)).encode('utf-8'))
+    refreshed = get_refreshed_version()
+    if refreshed is not None:
+        h.update(("refreshed:%s;"%(refreshed)).encode('utf-8'))
+    return "%s-%s"%(dist_version, h.hexdigest()[:16])
+
+
+class GamesCache(object):
+    """
+    Columnar cache of the games data frame, partitioned by season.
+
+    Each season is stored in its own directory, with each column as its
+    own .npy file, so later runs can memory-map the columns of only the
+    seasons they need instead of re-parsing the games JSON. Each
+    partition also holds its inverted team index (see team_rows.py).
+
+    The manifest records the data version and a content hash of every
+    partition. When the data version changes (a new version of
+    blaseball_core_game_data), the games are re-parsed, but only the
+    partitions whose contents changed (e.g. the current season) are
+    written again. Seasons are stored in season order, and the games
+    within a season keep their original order.
+    """
+    def __init__(self, cache_dir=None):
+        self.cache_dir = get_cache_dir(cache_dir)
+        self.data_version = get_data_version()
+        self.path = os.path.join(self.cache_dir, "games-v%d"%(CACHE_FORMAT_VERSION))
+        # Manifest of the cache, and the partitions of the last load
+        self.manifest = None
+        self.loaded = []
+        self.loaded_keys = []
+        # Seasons whose partitions could not be read (save rewrites them)
+        self.damaged = set()
+
+    def exists(self):
+        return os.path.exists(os.path.join(self.path, MANIFEST))
+
+    def read_manifest(self):
+        """Read the manifest (returns None if it is missing or unreadable)"""
+        try:
+            with open(os.path.join(self.path, MANIFEST), 'r') as f:
+                manifest = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if manifest.get('format') != CACHE_FORMAT_VERSION:
+            return None
+        return manifest
+
+    def seasons(self):
+        """Get the (0-indexed) seasons in the cache"""
+        manifest = self.manifest or self.read_manifest()
+        if manifest is None:
+            return []
+        return [int(s) for s in manifest['partitions']]
+
+    def load(self, columns=None, seasons=None):
+        """
+        Load the cached data frame, memory-mapping numeric columns.
+        If columns is given, only those columns are read. If seasons
+        (0-indexed) is given, only the partitions of those seasons are read.
+        Returns None if there is no valid cache for the current data version.
+        """
+        arrays = self.load_arrays(columns, seasons)
+        if arrays is None:
+            return None
+        import pandas as pd
+        return pd.DataFrame(arrays[1], columns=arrays[0], copy=False)
+
+    def load_arrays(self, columns=None, seasons=None):
+        """
+        Load the cached columns as NumPy arrays, without pandas
+        (see load for the arguments).
+        Returns: tuple (list of column names, dict of column name to
+        array), or None if there is no valid cache for the current data version
+        """
+        manifest = self.read_manifest()
+        if manifest is None or manifest['data_version'] != self.data_version:
+            return None
+        order = [c for c in manifest['order'] if columns is None or c in columns]
+        keys = [s for s in sorted(manifest['partitions'], key=int) if seasons is None or int(s) in seasons]
+        partitions = [manifest['partitions'][s] for s in keys]
+        parts = []
+        for key, part in zip(keys, partitions):
+            path = os.path.join(self.path, part['dir'])
+            try:
+                parts.append(dict((name, self._load_column(path, part['columns'][name])) for name in order))
+            except (OSError, ValueError, KeyError):
+                # Corrupt or partial partition
+                self.damaged.add(key)
+        if self.damaged:
+            return None
+        self.manifest = manifest
+        self.loaded = partitions
+        self.loaded_keys = keys
+        if len(parts) == 1:
+            data = parts[0]
+        elif len(parts) == 0:
+            data = dict((name, self._empty_column(manifest['columns'][name])) for name in order)
+        else:
+            data = dict((name, np.concatenate([part[name] for part in parts])) for name in order)
+        return (order, data)
+
+    def column_nbytes(self):
+        """
+        Get the in-memory size (in bytes) of each column of the last
+        cache loaded, as measured when the cache was written
+        """
+        nbytes = {}
+        for part in self.loaded:
+            for name, meta in part['columns'].items():
+                nbytes[name] = nbytes.get(name, 0) + meta['nbytes']
+        return nbytes
+
+    def load_team_rows(self):
+        """
+        Load the inverted team index of the last cache loaded
+        (the partitions' indexes, joined end to end).
+        Returns None if it cannot be read.
+        """
+        if self.manifest is None:
+            return None
+        parts = []
+        for key, part in zip(self.loaded_keys, self.loaded):
+            path = os.path.join(self.path, part['dir'])
+            try:
+                positions = np.load(os.path.join(path, TEAM_POSITIONS), mmap_mode='r')
+                offsets = np.load(os.path.join(path, TEAM_OFFSETS))
+                parts.append(TeamRows(part['teams'], offsets, positions, part['nrows']))
+            except (OSError, ValueError, KeyError):
+                self.damaged.add(key)
+        if self.damaged:
+            return None
+        if len(parts) == 1:
+            return parts[0]
+        return TeamRows.concat(parts)
+
+    def save(self, df):
+        """
+        Write the data frame to the cache, one partition per season.
+        A partition whose contents have not changed since the last save
+        is kept as it is. New partitions are written to temporary
+        directories and renamed into place, and the manifest is replaced
+        last, so readers never see a half-written cache.
+        Partitions no longer in the manifest are removed.
+        """
+        os.makedirs(self.path, exist_ok=True)
+        old = self.read_manifest() or {'partitions': {}}
+        manifest = {
+            'format': CACHE_FORMAT_VERSION,
+            'data_version': self.data_version,
+            'nrows': len(df),
+            'order': list(df.columns),
+            'columns': {},
+            'partitions': {},
+        }
+        seasons = df['season'].to_numpy()
+        for season in np.unique(seasons):
+            part = df.iloc[np.flatnonzero(seasons == season)].reset_index(drop=True)
+            arrays, metas, digest = self._partition_arrays(part)
+            key = str(int(season))
+            previous = old['partitions'].get(key)
+            if previous is not None and previous['hash'] == digest and key not in self.damaged \
+                    and self._partition_complete(previous):
+                manifest['partitions'][key] = previous
+                continue
+            manifest['partitions'][key] = self._save_partition(key, part, arrays, metas, digest)
+        for name in df.columns:
+            manifest['columns'][name] = {'dtype': str(df[name].dtype)}
+
+        fd, tmp_manifest = tempfile.mkstemp(prefix="." + MANIFEST + ".", dir=self.path)
+        try:
+            with os.fdopen(fd, 'w') as f:
+                json.dump(manifest, f)
+            os.replace(tmp_manifest, os.path.join(self.path, MANIFEST))
+        except Exception:
+            if os.path.exists(tmp_manifest):
+                os.unlink(tmp_manifest)
+            raise
+        self.manifest = manifest
+        self._remove_stale()
+
+    def clear(self):
+        """Remove every cached version of the game data"""
+        if not os.path.isdir(self.cache_dir):
+            return
+        for name in os.listdir(self.cache_dir):
+            if name.startswith("games-") or name.startswith(".games-"):
+                shutil.rmtree(os.path.join(self.cache_dir, name), ignore_errors=True)
+
+    def _remove_stale(self):
+        """Remove older cache formats, and partitions the manifest no longer uses"""
+        current = os.path.basename(self.path)
+        for name in os.listdir(self.cache_dir):
+            if name.startswith("games-") and name != current:
+                shutil.rmtree(os.path.join(self.cache_dir, name), ignore_errors=True)
+        used = set(part['dir'] for part in self.manifest['partitions'].values())
+        for name in os.listdir(self.path):
+            if (name.startswith("season-") and name not in used) or name.startswith(".season-"):
+                shutil.rmtree(os.path.join(self.path, name), ignore_errors=True)
+
+    def _partition_complete(self, part):
+        """Check that every file of a partition (columns and team index) exists"""
+        path = os.path.join(self.path, part['dir'])
+        fnames = [TEAM_POSITIONS, TEAM_OFFSETS]
+        for meta in part['columns'].values():
+            fnames.append(meta['file'] + ".npy")
+            if meta.get('nulls', False):
+                fnames.append(meta['file'] + ".nulls.npy")
+        return all(os.path.isfile(os.path.join(path, fname)) for fname in fnames)
+
+    def _partition_arrays(self, part):
+        """
+        Convert a partition's columns to the arrays that are saved.
+        Returns: tuple (dict of file name to array, dict of column name
+        to metadata, content hash of the partition)
+        """
+        h = hashlib.sha256()
+        arrays, metas = {}, {}
+        for i, name in enumerate(part.columns):
+            meta, column_arrays = self._column_arrays("c%03d"%(i), part[name])
+            metas[name] = meta
+            arrays.update(column_arrays)
+            h.update(("%s:%s;"%(name, meta['kind'])).encode('utf-8'))
+            for fname in sorted(column_arrays):
+                values = column_arrays[fname]
+                h.update(("%s:%s:%s;"%(fname, values.dtype.str, values.shape)).encode('utf-8'))
+                h.update(np.ascontiguousarray(values).tobytes())
+        return (arrays, metas, h.hexdigest())
+
+    def _save_partition(self, key, part, arrays, metas, digest):
+        """Write one partition to a new directory. Returns: the partition's metadata"""
+        dirname = "season-%03d-%s"%(int(key), digest[:12])
+        tmp_path = tempfile.mkdtemp(prefix=".season-", dir=self.path)
+        try:
+            for fname, values in arrays.items():
+                np.save(os.path.join(tmp_path, fname + ".npy"), values)
+            team_rows = TeamRows.from_frame(part)
+            np.save(os.path.join(tmp_path, TEAM_POSITIONS), team_rows.positions)
+            np.save(os.path.join(tmp_path, TEAM_OFFSETS), team_rows.offsets)
+            final_path = os.path.join(self.path, dirname)
+            if os.path.exists(final_path):
+                shutil.rmtree(final_path)
+            os.rename(tmp_path, final_path)
+        except Exception:
+            shutil.rmtree(tmp_path, ignore_errors=True)
+            raise
+        return {
+            'dir': dirname,
+            'hash': digest,
+            'nrows': len(part),
+            'columns': metas,
+            'teams': team_rows.teams,
+        }
+
+    def _column_arrays(self, fname, col):
+        """
+        Convert one column to the arrays to save. Numeric, boolean and
+        datetime columns are stored as-is; string columns as fixed-width
+        unicode plus a null mask; anything else (lists, dicts) as JSON strings.
+        Returns: tuple (column metadata, dict of file name to array)
+        """
+        meta = {'file': fname, 'nbytes': int(col.memory_usage(index=False, deep=True))}
+        values = col.to_numpy()
+        if values.dtype.kind in 'biufcmM':
+            meta['kind'] = 'numeric'
+            return (meta, {fname: values})
+
+        nulls = col.isna().to_numpy()
+        if all(isinstance(v, str) for v in values[~nulls]):
+            meta['kind'] = 'string'
+            strings = np.where(nulls, '', values).astype(str)
+        else:
+            meta['kind'] = 'json'
+            strings = np.array([json.dumps(v) for v in values], dtype=str)
+        arrays = {fname: strings}
+        meta['nulls'] = bool(nulls.any())
+        if meta['nulls']:
+            arrays[fname + ".nulls"] = nulls
+        return (meta, arrays)
+
+    def _empty_column(self, meta):
+        """An empty column with the column's dtype (when no partition is loaded)"""
+        dtype = np.dtype(meta['dtype'])
+        return np.empty(0, dtype=object if dtype.kind == 'O' else dtype)
+
+    def _load_column(self, path, meta):
+        fname = os.path.join(path, meta['file'])
+        values = np.load(fname + ".npy", mmap_mode='r')
+        if meta['kind'] == 'numeric':
+            return values
+
+        if meta['kind'] == 'string':
+            values = values.astype(object)
+        else:
+            decoded = np.empty(len(values), dtype=object)
+            for i, v in enumerate(values):
+                decoded[i] = json.loads(v)
+            values = decoded
+        if meta.get('nulls', False):
+            nulls = np.load(fname + ".nulls.npy")
+            values[nulls] = None
+        return values
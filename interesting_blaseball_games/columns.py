@@ -0,0 +1,29 @@
+# Names of the game data columns the tool works with, kept apart
+# from game_data.py so that code without pandas can use them
+
+# Columns needed by the data filters and to add the score columns
+# (on top of the columns the views display and the reasons use)
+FILTER_COLUMNS = ['season', 'day', 'isPostseason', 'homeTeamNickname', 'awayTeamNickname',
+                  'homeScore', 'awayScore', 'winningScore', 'losingScore']
+
+# Columns added by _add_columns
+SCORE_COLUMNS = ['winningLosingScore', 'homeAwayScore']
+
+# Compact dtypes for the integer and boolean columns
+INT_COLUMNS = ['season', 'day', 'homeScore', 'awayScore', 'winningScore', 'losingScore', 'runDiff']
+BOOL_COLUMNS = ['isPostseason', 'shame']
+
+
+def needed_columns(display_columns=None, reasons=()):
+    """
+    Get the list of columns needed for a query that displays the
+    given columns and evaluates the given reasons (None means keep every column)
+    """
+    if display_columns is None:
+        return None
+    columns = []
+    reason_columns = [c for reason in reasons for c in reason.columns]
+    for c in FILTER_COLUMNS + reason_columns + SCORE_COLUMNS + list(display_columns):
+        if c not in columns:
+            columns.append(c)
+    return columns
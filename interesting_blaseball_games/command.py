@@ -2,15 +2,18 @@ import sys
 import os
 import json
 import configargparse
-from .view import NAMESTYLE_CHOICES, RichView, MarkdownView
-from .game_data import REASON2FUNCTION
 from .util import (
     root_path, 
     data_path,
-    get_league_division_team_data,
-    league_to_teams,
-    division_to_teams
+    get_team_index,
+    NAMESTYLE_CHOICES,
+    REASON_CHOICES,
+    ENGINE_CHOICES,
+    RESULT_CACHE_SIZE
 )
+from .reasons import select_reasons
+from .explain import Explain, NO_EXPLAIN, EXPLAIN_CHOICES
+from .output import IF_EXISTS_CHOICES, EXPORT_CHOICES
 
 
 """
@@ -34,12 +37,47 @@ from .util import (
 """
 
 
-def main(sysargs = sys.argv[1:]):
+# Options a query can set (in a server query or a batch query spec), by their
+# command line flag names, and the ones that are on/off flags
+QUERY_KEYS = [
+    'reason',
+    'season',
+    'postseason',
+    'team',
+    'division',
+    'league',
+    'n-results',
+    'offset',
+    'name-style',
+    'win-loss',
+    'home-away',
+    'winning-pitcher',
+    'losing-pitcher',
+]
+FLAG_KEYS = ['postseason', 'win-loss', 'home-away', 'winning-pitcher', 'losing-pitcher']
+
+
+class QueryError(Exception):
+    """Raised when a query is not valid (the server reports it to the client as a 400)"""
+    pass
+
+
+class QueryParser(configargparse.ArgParser):
+    """Command line parser that raises QueryError instead of exiting"""
+    def error(self, message):
+        raise QueryError(message)
 
-    p = configargparse.ArgParser()
+
+def get_parser(parser_class=configargparse.ArgParser):
+    """
+    Create the parser for command line flags and config file options.
+    (The query server uses the same parser to parse queries.)
+    """
+    p = parser_class()
 
     # These are safe for command line usage
-    LEAGUES, DIVISIONS, ALLTEAMS = get_league_division_team_data()
+    team_index = get_team_index()
+    LEAGUES, DIVISIONS, ALLTEAMS = team_index.leagues, team_index.divisions, team_index.teams
 
     p.add('-v',
           '--version',
@@ -69,14 +107,23 @@ def main(sysargs = sys.argv[1:]):
           type=int,
           default=10,
           help='max number of rows to show in each table (default 10)')
+    p.add('--offset',
+          required=False,
+          type=int,
+          default=0,
+          help='skip this many top-ranked rows in each table, to show the next n rows (default 0)')
 
     # -----
     # View options
     p.add('--reason',
           required=False,
-          choices=list(REASON2FUNCTION.keys()),
           default='all',
-          help='the reason that a game is interesting (controls which tables are shown, defaults to all)')
+          help='the reason that a game is interesting (controls which tables are shown): %s, or a reason from --reasons-file (defaults to all)'%(", ".join(REASON_CHOICES)))
+    p.add('--reasons-file',
+          required=False,
+          type=str,
+          default=None,
+          help='INI file defining more reasons (one section per reason, with predicate, sort and description keys)')
 
     p.add('--season',
           required=False,
@@ -116,6 +163,21 @@ def main(sysargs = sys.argv[1:]):
           type=str,
           default='',
           help='Specify the name of the Markdown output file, for use with --markdown flags')
+    p.add('--if-exists',
+          required=False,
+          choices=IF_EXISTS_CHOICES,
+          default='overwrite',
+          help='what to do if an output file already exists: overwrite it (default), or stop with an error')
+    p.add('--page-size',
+          required=False,
+          type=int,
+          default=None,
+          help='with rich output, format and print each table this many rows at a time, so large tables start showing at once')
+    p.add('--pager',
+          required=False,
+          default=False,
+          action='store_true',
+          help='with rich output in a terminal, wait for Enter (or q to quit) after each page of rows (pages fit the screen unless --page-size is given)')
 
     # View options for columns
     g = p.add_mutually_exclusive_group()
@@ -145,40 +207,215 @@ def main(sysargs = sys.argv[1:]):
           help='specify league')
 
     # -----
+    # Game data cache options
+    p.add('--cache-dir',
+          required=False,
+          type=str,
+          default=None,
+          help='directory for the on-disk game data cache (defaults to a directory under $XDG_CACHE_HOME or ~/.cache)')
+    p.add('--no-cache',
+          required=False,
+          default=False,
+          action='store_true',
+          help='do not read or write the on-disk game data and result caches')
+    p.add('--rebuild-cache',
+          required=False,
+          default=False,
+          action='store_true',
+          help='rebuild the on-disk game data cache and exit')
+    p.add('--clear-cache',
+          required=False,
+          default=False,
+          action='store_true',
+          help='remove the on-disk game data and result caches and exit')
+    p.add('--result-cache-size',
+          required=False,
+          type=float,
+          default=RESULT_CACHE_SIZE,
+          help='size cap (in MB) of the on-disk cache of query results; the least recently used results are removed first, and 0 turns the result cache off (default %(default)g)')
+    p.add('--engine',
+          required=False,
+          type=str,
+          default='pandas',
+          choices=ENGINE_CHOICES,
+          help='backend for filtering and ranking games: pandas data frames, or NumPy arrays (only for --rich and --markdown output)')
 
-    # Print help, if no arguments provided
-    if len(sysargs)==0:
-        p.print_help()
-        exit(0)
+    # -----
+    # Data refresh options
+    p.add('--refresh',
+          required=False,
+          default=False,
+          action='store_true',
+          help='download new game and team data from --refresh-source (only files that changed), then exit')
+    p.add('--refresh-source',
+          required=False,
+          type=str,
+          default=None,
+          help='base URL serving games.json and teams.json, for --refresh and --refresh-interval')
+    p.add('--refresh-interval',
+          required=False,
+          type=float,
+          default=None,
+          help='with --serve, refresh the data from --refresh-source every this many seconds, in the background')
 
-    # Parse arguments
-    options = p.parse_args(sysargs)
+    # -----
+    # Profiling options
+    p.add('--explain',
+          '--profile',
+          required=False,
+          nargs='?',
+          const='table',
+          default=None,
+          choices=EXPLAIN_CHOICES,
+          help='report wall time, peak memory, and row counts after each stage of the query, as a table (default) or as json')
+    p.add('--explain-output',
+          required=False,
+          type=str,
+          default=None,
+          help='write the --explain report to this file instead of stderr')
+    p.add('--explain-memory',
+          required=False,
+          action='store_true',
+          default=False,
+          help='with --explain, measure the peak memory of each stage with tracemalloc (slower, and the stage times are less accurate) instead of the peak RSS of the process')
 
-    # If the user asked for the version,
-    # print the version number and exit.
-    if options.version:
-        from . import _program, __version__
-        print(_program, __version__)
-        sys.exit(0)
+    # -----
+    # Query server options
+    p.add('--serve',
+          required=False,
+          default=False,
+          action='store_true',
+          help='run a query server that keeps the game data loaded and answers queries over HTTP')
+    p.add('--host',
+          required=False,
+          type=str,
+          default='127.0.0.1',
+          help='host address for the query server to listen on (default 127.0.0.1)')
+    p.add('--port',
+          required=False,
+          type=int,
+          default=8080,
+          help='port for the query server to listen on (default 8080)')
+    p.add('--socket',
+          required=False,
+          type=str,
+          default=None,
+          help='listen on this Unix socket path instead of a host and port')
+
+    # -----
+    # Export options
+    p.add('--export',
+          required=False,
+          choices=EXPORT_CHOICES,
+          default=None,
+          help='export every matching game for each reason (not only the first n) to one file per reason, as csv, ndjson, parquet or html')
+    p.add('--export-dir',
+          required=False,
+          type=str,
+          default='.',
+          help='directory for the --export files (default: the current directory)')
+
+    # -----
+    # Per-team report options
+    p.add('--per-team',
+          required=False,
+          type=str,
+          default=None,
+          help='write one Markdown report per team to this directory (for every team, or the teams/divisions/leagues given)')
+
+    # -----
+    # Batch options
+    p.add('--batch',
+          required=False,
+          type=str,
+          default=None,
+          help='run every query in this file of query specs (JSON, with the same keys as the config file), writing each result to its own output file')
+    p.add('--workers',
+          required=False,
+          type=int,
+          default=None,
+          help='number of worker processes for --batch (defaults to the number of CPUs)')
+
+    # -----
+    # Watch options
+    p.add('--watch',
+          required=False,
+          default=False,
+          action='store_true',
+          help='keep the tables on screen and redraw them when the config file or the (refreshed) game data changes')
+    p.add('--watch-interval',
+          required=False,
+          type=float,
+          default=2.0,
+          help='seconds between checks for changes with --watch (default 2)')
+
+    # -----
+    # Live game options
+    p.add('--live',
+          required=False,
+          type=str,
+          default=None,
+          help='follow the live game feed (server-sent events) at this URL, and update the tables as games complete')
+
+    return p
+
+
+def check_modes(options):
+    """
+    Make sure the output modes the options ask for work together
+    (used by main, and by --watch when the config file changes)
+    """
+    # The numpy engine only backs the Rich and Markdown views
+    if options.engine != 'pandas' and (options.serve or options.batch or options.export or options.per_team or options.live or options.watch):
+        raise Exception("Error: --engine %s only works with --rich and --markdown output"%(options.engine))
+
+    # The pager waits for input between pages, which live updates can't do
+    if options.pager and (options.live or options.watch):
+        raise Exception("Error: --pager does not work with --live or --watch")
+
+    # Watch mode redraws rich tables in place
+    if options.watch and (options.markdown or options.live or options.export or options.per_team or options.serve or options.batch):
+        raise Exception("Error: --watch only works with --rich output")
+
+
+def process_options(options):
+    """
+    Turn parsed options into the form GameData and the views expect:
+    divisions and leagues become lists of teams, and missing
+    team and season options mean all teams and all seasons.
+    """
+    team_index = get_team_index()
 
     # If the user specified a division or a league,
     # turn that into a list of teams for them
     if options.division:
         divteams = []
         for div in options.division:
-            divteams += division_to_teams(div)
+            divteams += team_index.division_teams(div)
         options.team = divteams
         options.division = None
     if options.league:
         leateams = []
         for lea in options.league:
-            leateams += league_to_teams(lea)
+            leateams += team_index.league_teams(lea)
         options.team = leateams
         options.league = None
 
     # If nothing was supplied for team/division/league, use all teams
     if not options.team and not options.division and not options.league:
-        options.team = ALLTEAMS
+        options.team = team_index.teams
+
+    # Check the reason (built-in, or defined in the reasons file)
+    select_reasons(options.reason, options.reasons_file)
+
+    if options.n_results < 0:
+        raise Exception("Error: --n-results must not be negative")
+    if options.offset < 0:
+        raise Exception("Error: --offset must not be negative")
+    if options.page_size is not None and options.page_size < 1:
+        raise Exception("Error: --page-size must be at least 1")
+    if options.watch_interval <= 0:
+        raise Exception("Error: --watch-interval must be more than 0 seconds")
 
     # If nothing was provided for seasons, set it to 'all'
     if not options.season:
@@ -189,13 +426,108 @@ def main(sysargs = sys.argv[1:]):
         except ValueError:
             raise Exception("Error: you must provide integers to the --season flag: --season 1 --season 2")
 
-    if options.markdown:
-        v = MarkdownView(options)
-        v.make_table()
+    return options
+
+
+def main(sysargs = sys.argv[1:]):
+
+    # If the user only asked for the version, print it and exit
+    # before doing anything else (like loading the teams data);
+    # anything else on the command line is checked by the parser first
+    if list(sysargs) in (['-v'], ['--version']):
+        from . import _program, __version__
+        print(_program, __version__)
+        sys.exit(0)
+
+    p = get_parser()
+
+    # Print help, if no arguments provided
+    if len(sysargs)==0:
+        p.print_help()
+        exit(0)
+
+    # Parse arguments
+    options = p.parse_args(sysargs)
+
+    # If the user asked for the version,
+    # print the version number and exit.
+    if options.version:
+        from . import _program, __version__
+        print(_program, __version__)
+        sys.exit(0)
+
+    # If the user asked to refresh the data, do that and exit
+    if options.refresh:
+        from .refresh import run_refresh
+        run_refresh(options)
+        sys.exit(0)
+
+    check_modes(options)
+
+    # If the user asked to clear or rebuild the
+    # game data cache, do that and exit.
+    if options.clear_cache or options.rebuild_cache:
+        from .cache import GamesCache
+        from .game_data import build_games_frame
+        from .result_cache import ResultCache
+        cache = GamesCache(options.cache_dir)
+        cache.clear()
+        ResultCache(options.cache_dir).clear()
+        if options.rebuild_cache:
+            cache.save(build_games_frame())
+            print("Rebuilt game data cache in %s"%(cache.path))
+        else:
+            print("Cleared game data and result caches in %s"%(cache.cache_dir))
+        sys.exit(0)
+
+    # If the user asked for a query server, run it until interrupted
+    if options.serve:
+        from .server import serve
+        serve(options)
+        sys.exit(0)
+
+    # If the user gave a file of query specs, run them all and exit
+    if options.batch:
+        from .batch import run_batch
+        failed = run_batch(options)
+        sys.exit(1 if failed else 0)
+
+    options = process_options(options)
+
+    # Import the views (and with them pandas and rich) only now,
+    # so that --help and argument errors stay fast
+    from .view import RichView, MarkdownView
+    explain = NO_EXPLAIN
+    if options.explain:
+        explain = Explain(options.explain_memory)
+
+    if options.export:
+        from .export import ExportView
+        ExportView(options, explain=explain).make_table()
+    elif options.per_team:
+        from .per_team import run_per_team
+        run_per_team(options, explain=explain)
+    elif options.live:
+        from .live import run_live
+        run_live(options, explain=explain)
+    elif options.watch:
+        from .watch import run_watch
+        run_watch(options, sysargs, explain=explain)
     else:
-        v = RichView(options)
+        # Repeated queries are answered from the result cache
+        result_cache = None
+        if not options.no_cache and options.result_cache_size > 0:
+            from .result_cache import ResultCache
+            result_cache = ResultCache(options.cache_dir, options.result_cache_size)
+        if options.markdown:
+            v = MarkdownView(options, explain=explain, result_cache=result_cache)
+        else:
+            v = RichView(options, explain=explain, result_cache=result_cache)
         v.make_table()
 
+    if options.explain:
+        explain.report(options.explain, options.explain_output)
+
 
 if __name__ == '__main__':
     main()
@@ -0,0 +1,88 @@
+import os
+import json
+import blaseball_core_game_data as gd
+from . import _program
+
+
+DATA_DIR_ENV = "INTERESTING_BLASEBALL_GAMES_DATA"
+
+# Manifest of the refreshed data files in the data directory
+DATA_MANIFEST = "data.json"
+
+# Data sets that can be refreshed, and their file names at the refresh source
+DATA_FILES = {'games': 'games.json', 'teams': 'teams.json'}
+
+
+def get_data_dir(data_dir=None):
+    """
+    Get the directory holding refreshed game and team data (see refresh.py).
+    Precedence: explicit argument, environment variable,
+    $XDG_DATA_HOME, ~/.local/share
+    """
+    if data_dir:
+        return os.path.abspath(data_dir)
+    if os.environ.get(DATA_DIR_ENV):
+        return os.path.abspath(os.environ[DATA_DIR_ENV])
+    xdg = os.environ.get("XDG_DATA_HOME", os.path.join(os.path.expanduser("~"), ".local", "share"))
+    return os.path.abspath(os.path.join(xdg, _program))
+
+
+def read_data_manifest(data_dir=None):
+    """
+    Read the manifest of the refreshed data files
+    (returns None if nothing has been refreshed)
+    """
+    try:
+        with open(os.path.join(get_data_dir(data_dir), DATA_MANIFEST), 'r') as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if not isinstance(manifest, dict) or not isinstance(manifest.get('files'), dict):
+        return None
+    return manifest
+
+
+def _read_refreshed(name, data_dir=None):
+    """
+    Read a refreshed data file, or return None if there is none.
+    A file the manifest names but that cannot be read is an error
+    (falling back to the package's data would mix up data versions)
+    """
+    manifest = read_data_manifest(data_dir)
+    if manifest is None or 'file' not in (manifest['files'].get(name) or {}):
+        return None
+    path = os.path.join(get_data_dir(data_dir), manifest['files'][name]['file'])
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return f.read()
+    except OSError as e:
+        raise Exception("Error: could not read refreshed %s data %s (run --refresh again): %s"%(name, path, e))
+
+
+def get_games_data():
+    """
+    Get the games JSON: the refreshed copy in the data directory
+    if there is one, otherwise the data in blaseball_core_game_data
+    """
+    data = _read_refreshed('games')
+    return gd.get_games_data() if data is None else data
+
+
+def get_teams_data():
+    """
+    Get the teams JSON: the refreshed copy in the data directory
+    if there is one, otherwise the data in blaseball_core_game_data
+    """
+    data = _read_refreshed('teams')
+    return gd.get_teams_data() if data is None else data
+
+
+def get_refreshed_version(data_dir=None):
+    """
+    Get a string identifying the refreshed data files
+    (their content hashes), or None if nothing has been refreshed
+    """
+    manifest = read_data_manifest(data_dir)
+    if manifest is None or len(manifest['files']) == 0:
+        return None
+    return ";".join("%s:%s"%(name, manifest['files'][name].get('sha256', '')) for name in sorted(manifest['files']))
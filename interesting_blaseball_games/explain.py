@@ -0,0 +1,97 @@
+import sys
+import json
+import time
+import contextlib
+import tracemalloc
+try:
+    import resource
+except ImportError:
+    # Not available on Windows
+    resource = None
+
+
+EXPLAIN_CHOICES = ['table', 'json']
+
+
+def peak_rss_bytes():
+    """Get the peak resident set size of the process so far, or None if it is not available"""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports KiB, macOS reports bytes
+    return peak if sys.platform == 'darwin' else peak*1024
+
+
+class Explain(object):
+    """
+    Collects the wall time, peak memory, and number of rows
+    after each stage of a query (load, filters, reasons, render).
+
+    By default the peak memory is the peak resident set size of the
+    process after each stage, which costs nothing to read. With
+    trace_memory, tracemalloc measures the peak memory allocated
+    during each stage instead, which slows every stage down (by a
+    different amount in each stage), so the times are less accurate.
+    """
+    def __init__(self, trace_memory=False):
+        self.stages = []
+        self.trace_memory = trace_memory
+        if trace_memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+
+    @contextlib.contextmanager
+    def stage(self, name):
+        """
+        Time a stage. The caller sets record['rows'] to the
+        number of rows the stage produced, and may set
+        record['detail'] to a short note (e.g. memory saved).
+        """
+        record = {'stage': name, 'rows': None}
+        if self.trace_memory:
+            tracemalloc.reset_peak()
+        t0 = time.perf_counter()
+        try:
+            yield record
+        finally:
+            record['seconds'] = time.perf_counter() - t0
+            if self.trace_memory:
+                record['peak_bytes'] = tracemalloc.get_traced_memory()[1]
+            else:
+                record['peak_bytes'] = peak_rss_bytes()
+            self.stages.append(record)
+
+    def report(self, fmt='table', output=None):
+        """Write the stages as a table or as JSON, to stderr or to the output file"""
+        memory = 'tracemalloc' if self.trace_memory else 'rss'
+        if fmt == 'json':
+            text = json.dumps({
+                'stages': self.stages,
+                'total_seconds': sum(s['seconds'] for s in self.stages),
+                'memory': memory,
+            }) + "\n"
+        else:
+            peak_header = "Peak (MiB)" if self.trace_memory else "Peak RSS (MiB)"
+            lines = ["%-28s %10s %14s %10s  %s"%("Stage", "Time (ms)", peak_header, "Rows", "Detail")]
+            for s in self.stages:
+                rows = "" if s['rows'] is None else "%d"%(s['rows'])
+                peak = "" if s['peak_bytes'] is None else "%.2f"%(s['peak_bytes']/2**20)
+                line = "%-28s %10.1f %14s %10s  %s"%(s['stage'], 1000*s['seconds'], peak, rows, s.get('detail', ''))
+                lines.append(line.rstrip())
+            lines.append("%-28s %10.1f"%("Total", 1000*sum(s['seconds'] for s in self.stages)))
+            text = "\n".join(lines) + "\n"
+
+        if output:
+            with open(output, 'w') as f:
+                f.write(text)
+        else:
+            sys.stderr.write(text)
+
+
+class NoExplain(object):
+    """Stand-in for Explain when no report was requested (does nothing)"""
+    @contextlib.contextmanager
+    def stage(self, name):
+        yield {}
+
+
+NO_EXPLAIN = NoExplain()
@@ -0,0 +1,109 @@
+import os
+import sys
+import html
+from .game_data import reason_masks, reason_order
+from .output import atomic_output, check_output_file
+from .view import View, decode_emoji
+
+# Rows converted and written at a time
+CHUNK_SIZE = 10000
+
+
+class ExportView(View):
+    """
+    Export the complete, ranked result of each reason (not only the
+    first n rows) to one file per reason, as CSV, newline-delimited
+    JSON, Parquet, or HTML. Rows are converted and written in chunks,
+    so memory use does not grow with the size of the result.
+    """
+    def make_table(self):
+        """Write one file per reason to the export directory"""
+        fmt = self.options.export
+        outdir = self.options.export_dir
+        if not os.path.isdir(outdir):
+            raise Exception("Error: export directory (%s) does not exist!"%(os.path.abspath(outdir)))
+
+        reasons = self.game_data.reasons
+        paths = dict((reason.name, os.path.join(outdir, "%s.%s"%(reason.name, fmt))) for reason in reasons)
+        for path in paths.values():
+            check_output_file(path, self.if_exists)
+
+        df = self.game_data.df
+        masks = reason_masks(df, reasons)
+        for reason in reasons:
+            with self.explain.stage("export: %s"%(reason.name)) as record:
+                positions = reason_order(df, reason, masks)
+                write = getattr(self, "_write_%s"%(fmt))
+                chunks = self._html_chunks(df, positions, reason.name) if fmt=='html' else self._chunks(df, positions)
+                with atomic_output(paths[reason.name], self.if_exists, binary=(fmt=='parquet')) as f:
+                    write(f, chunks, reason.name)
+                record['rows'] = len(positions)
+            print("Exported %d games to %s"%(len(positions), paths[reason.name]), file=sys.stderr)
+
+    def _chunks(self, df, positions):
+        """
+        Yield the rows at positions (in order) a chunk at a time,
+        with the view's columns: seasons and days 1-indexed,
+        and emoji decoded
+        """
+        for start in range(0, len(positions), CHUNK_SIZE):
+            chunk = df.iloc[positions[start:start+CHUNK_SIZE]][self.column_headers].reset_index(drop=True)
+            chunk = chunk.assign(season=chunk['season'].astype('int64') + 1, day=chunk['day'].astype('int64') + 1)
+            for column_header in self.column_headers:
+                if column_header[-5:]=='Emoji':
+                    chunk[column_header] = decode_emoji(chunk[column_header].to_numpy())
+            yield chunk
+
+    def _html_chunks(self, df, positions, reason):
+        """
+        Yield the rows at positions (in order) a chunk at a time, formatted
+        for display the same way as the views (see View.format_table)
+        """
+        for start in range(0, len(positions), CHUNK_SIZE):
+            chunk = df.iloc[positions[start:start+CHUNK_SIZE]]
+            yield self.format_table(chunk, reason, 0, len(chunk))
+
+    def _write_csv(self, f, chunks, reason):
+        first = True
+        for chunk in chunks:
+            chunk.to_csv(f, header=first, index=False)
+            first = False
+        if first:
+            f.write(",".join(self.column_headers) + "\n")
+
+    def _write_ndjson(self, f, chunks, reason):
+        for chunk in chunks:
+            f.write(chunk.to_json(orient='records', lines=True, force_ascii=False).rstrip("\n") + "\n")
+
+    def _write_parquet(self, f, chunks, reason):
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise Exception("Error: --export parquet requires pyarrow (pip install pyarrow)")
+        writer = None
+        try:
+            for chunk in chunks:
+                table = pa.Table.from_pandas(chunk, preserve_index=False)
+                if writer is None:
+                    writer = pq.ParquetWriter(f, table.schema)
+                writer.write_table(table)
+            if writer is None:
+                # No games, write the columns only
+                empty = self.game_data.df[self.column_headers].iloc[:0]
+                writer = pq.ParquetWriter(f, pa.Table.from_pandas(empty, preserve_index=False).schema)
+        finally:
+            if writer is not None:
+                writer.close()
+
+    def _write_html(self, f, chunks, reason):
+        f.write("<!DOCTYPE html>\n<html>\n<head><meta charset=\"utf-8\"><title>%s</title></head>\n<body>\n"%(html.escape(reason)))
+        f.write("<p>%s</p>\n"%(html.escape(self.table_description(reason))))
+        f.write("<table>\n<thead>\n<tr>")
+        nice_column_headers = [nice for column, nice in zip(self.column_headers, self.nice_column_headers) if 'Odds' not in column]
+        f.write("".join("<th>%s</th>"%(html.escape(c)) for c in nice_column_headers))
+        f.write("</tr>\n</thead>\n<tbody>\n")
+        for formatted in chunks:
+            rows = zip(*[values.tolist() for _, _, values in formatted])
+            f.write("".join("<tr>" + "".join("<td>%s</td>"%(html.escape(v)) for v in row) + "</tr>\n" for row in rows))
+        f.write("</tbody>\n</table>\n</body>\n</html>\n")
@@ -1,85 +1,330 @@
+import io
 import os
+import sys
+import numpy as np
 import pandas as pd
-import blaseball_core_game_data as gd
+from .cache import GamesCache
+from .datasource import get_games_data
+from .loader import iter_games, game_filter, load_game_columns
+from .explain import NO_EXPLAIN
+from .team_rows import TeamRows
+from .reasons import select_reasons, reason_masks, check_reason_columns
+from .util import ranked_rows
+from .columns import (
+    SCORE_COLUMNS,
+    INT_COLUMNS,
+    BOOL_COLUMNS,
+    needed_columns,
+)
 
 
-def blowout(df):
+def sort_top(df, by, ascending, n=None):
     """
-    Filter the dataframe of game data on blowouts
-    (games with the largest run differential).
-    Returns: tuple (string reason, dataframe tabledata)
+    Sort the dataframe on the keys in by, and return the first n rows
+    (or all rows, if n is None).
+
+    Rather than sorting the whole frame, pick out the rows whose first
+    sort key ties with or beats the n-th best value of that key (a partial
+    selection, which is linear in the number of rows), and sort only those.
+    The sort is stable, so the result is identical to sorting the whole
+    frame and taking the first n rows.
     """
-    reason = 'blowout'
-    filt = df.sort_values(['winningScore', 'runDiff', 'season', 'day'], ascending=[False, False, True, True])
-    return (reason, filt)
+    if n is None or n <= 0 or n >= len(df):
+        filt = df.sort_values(by, ascending=ascending, kind='stable')
+        return filt if n is None else filt[:max(n, 0)]
+
+    values = df[by[0]].to_numpy()
+    if values.dtype.kind not in 'biuf':
+        return df.sort_values(by, ascending=ascending, kind='stable')[:n]
+    if values.dtype.kind == 'b':
+        values = values.astype('int8')
+
+    # Missing values are always sorted last
+    present = values[~np.isnan(values)] if values.dtype.kind == 'f' else values
+    if len(present) < n:
+        return df.sort_values(by, ascending=ascending, kind='stable')[:n]
+
+    if ascending[0]:
+        kth = np.partition(present, n-1)[n-1]
+        candidates = values <= kth
+    else:
+        kth = np.partition(present, len(present)-n)[len(present)-n]
+        candidates = values >= kth
 
+    filt = df.loc[candidates].sort_values(by, ascending=ascending, kind='stable')
+    return filt[:n]
 
-def shutout(df):
+
+def reason_top(df, reason, n=None, mask=None):
     """
-    Filter the dataframe of game data on shutouts
-    (games where one team has zero runs).
+    Select the games matching a reason (see reasons.py), and
+    return the first n of them in the reason's rank order.
+    mask is the reason's mask, if it was already computed.
     Returns: tuple (string reason, pd dataframe)
     """
-    reason = 'shutout'
-    filt = df.loc[df['losingScore']==0]
-    filt = filt.sort_values(['runDiff', 'season', 'day'], ascending=[False, True, True])
-    return (reason, filt)
+    if mask is None:
+        mask = reason.mask(df)
+    filt = df if mask is None else df.loc[mask]
+    return (reason.name, sort_top(filt, reason.by, reason.ascending, n))
 
 
-def shame(df):
+def game_reasons(game, reasons):
+    """
+    Decide which reasons a single game record qualifies for
+    (the same predicates as reason_masks, for one game at a time).
+    Returns: dict mapping reason name to bool
     """
-    Filter the dataframe of game data on shame
-    (games where one team was shamed).
+    masks = reason_masks(pd.DataFrame([game]), reasons)
+    return dict((name, True if mask is None else bool(mask[0])) for name, mask in masks.items())
 
-    Returns: tuple (string reason, pd dataframe)
+
+def iter_reasons(df, reasons, n=None, explain=NO_EXPLAIN):
+    """
+    Evaluate several reasons at once: build all of the masks together,
+    select each distinct subset of games only once, and sort each
+    reason's subset with its own keys. Each table is yielded as soon
+    as it is sorted, and each subset is dropped after the last reason
+    that uses it.
+    Yields: tuples (string reason, pd dataframe), in the same order as reasons
     """
-    reason = 'shame'
-    filt = df.loc[df['shame']==True]
-    filt = filt.sort_values(['runDiff', 'winningScore', 'season', 'day'], ascending=[False, False, True, True])
-    return (reason, filt)
+    with explain.stage("reason masks") as record:
+        masks = reason_masks(df, reasons)
+        record['rows'] = len(df)
+    uses = {}
+    for reason in reasons:
+        uses[id(masks[reason.name])] = uses.get(id(masks[reason.name]), 0) + 1
+    subsets = {}
+    for reason in reasons:
+        with explain.stage("reason: %s"%(reason.name)) as record:
+            mask = masks[reason.name]
+            if id(mask) not in subsets:
+                subsets[id(mask)] = df if mask is None else df.loc[mask]
+            table = (reason.name, sort_top(subsets[id(mask)], reason.by, reason.ascending, n))
+            record['rows'] = len(table[1])
+        uses[id(mask)] -= 1
+        if uses[id(mask)] == 0:
+            del subsets[id(mask)]
+        yield table
 
 
-def underdog(df):
+def all_reasons(df, reasons, n=None, explain=NO_EXPLAIN):
     """
-    Filter the dataframe of game data on underdog wins
-    (games where the team with lower odds won).
-    Returns: tuple (string reason, pd dataframe)
+    Evaluate several reasons at once (see iter_reasons).
+    Returns: list of tuples (string reason, pd dataframe),
+    in the same order as reasons
     """
-    reason = 'underdog'
-    filt = df.loc[df['winningOdds']<0.46]
-    filt = filt.sort_values(['runDiff', 'winningScore'], ascending=[False, False])
-    return (reason, filt)
+    return list(iter_reasons(df, reasons, n, explain))
 
 
-def maxedout(df):
+def reason_order(df, reason, masks=None):
     """
-    Filter the dataframe of game data on maxedout wins
-    (high-scoring games where the run differential is 1)
-    Returns: tuple (string reason, pd dataframe)
+    Get the positions of every row matching a reason, in the order the
+    reason ranks them (the same order as reason_top), without
+    copying more than the sort key columns.
+    Returns: numpy array of row positions
     """
-    reason = 'maxedout'
-    filt = df.loc[df['runDiff']==1]
-    filt = filt.sort_values(['winningScore','season','day'], ascending=[False, True, True])
-    return (reason, filt)
+    mask = reason.mask(df) if masks is None else masks[reason.name]
+    positions = np.arange(len(df)) if mask is None else np.flatnonzero(mask)
+    keys = df[reason.by].iloc[positions].reset_index(drop=True)
+    order = keys.sort_values(reason.by, ascending=reason.ascending, kind='stable').index.to_numpy()
+    return positions[order]
 
 
-def defensive(df):
-    reason = 'maxedout'
-    filt = df.loc[df['runDiff']==1]
-    filt = filt.sort_values(['winningScore','season','day'], ascending=[True, True, True])
-    return (reason, filt)
+def team_reasons(df, teams, reasons, n=None, explain=NO_EXPLAIN):
+    """
+    Evaluate reasons for every team in one pass: each reason's games
+    are sorted once, then every game is counted for both its home and
+    its away team, and the first n games of each team are kept.
+    The result for each team is the same as filtering on that team alone.
+    Returns: dict mapping team to list of tuples (string reason, pd dataframe)
+    """
+    masks = reason_masks(df, reasons)
+    home = df['homeTeamNickname'].to_numpy()
+    away = df['awayTeamNickname'].to_numpy()
+    result = dict((team, []) for team in teams)
+    for reason in reasons:
+        with explain.stage("reason: %s (all teams)"%(reason.name)) as record:
+            positions = reason_order(df, reason, masks)
+
+            # One row per (game, team), in sorted order
+            ranks = np.concatenate([np.arange(len(positions))]*2)
+            exploded = pd.DataFrame({
+                'team': np.concatenate([home[positions], away[positions]]),
+                'position': np.concatenate([positions, positions]),
+            }).iloc[np.argsort(ranks, kind='stable')]
+            exploded = exploded.loc[exploded['team'].isin(teams)]
+            top = exploded if n is None else exploded.groupby('team', sort=False).head(n)
 
+            for team, group in top.groupby('team', sort=False):
+                result[team].append((reason.name, df.iloc[group['position'].to_numpy()]))
+            for team in teams:
+                if len(result[team]) == 0 or result[team][-1][0] != reason.name:
+                    result[team].append((reason.name, df.iloc[:0]))
+            record['rows'] = len(top)
+    return result
 
-# Map reason strings to their corresponding filter function
-REASON2FUNCTION = {
-    "blowout": [blowout],
-    "shutout": [shutout],
-    "shame": [shame],
-    "underdog": [underdog],
-    "maxedout": [maxedout],
-    "defensive": [defensive],
-    "all": [blowout, shutout, shame, underdog, maxedout, defensive],
-}
+
+def project_frame(df, columns):
+    """Keep only the given columns (None means keep every column)"""
+    if columns is None:
+        return df
+    return df[[c for c in df.columns if c in columns]]
+
+
+def compact_frame(df):
+    """
+    Downcast the columns the tool uses to compact dtypes:
+    scores, season and day to small integers, and flags to bool.
+    Odds stay float64, so the percentages shown are the same as
+    before. Columns with missing values are left alone.
+    """
+    compact = {}
+    for c in INT_COLUMNS:
+        if c in df.columns and df[c].dtype.kind in 'iu':
+            # At least int16, so that season/day + 1 cannot overflow
+            lo, hi = (df[c].min(), df[c].max()) if len(df) else (0, 0)
+            info = np.iinfo(np.int16)
+            compact[c] = df[c].astype(np.int16 if info.min <= lo and hi <= info.max else np.int32)
+    for c in BOOL_COLUMNS:
+        if c in df.columns and df[c].dtype.kind != 'b' and not df[c].isna().any():
+            compact[c] = df[c].astype(bool)
+    return df.assign(**compact)
+
+
+def frame_nbytes(df):
+    """Size of a data frame in memory, in bytes"""
+    return int(df.memory_usage(index=False, deep=True).sum())
+
+
+def _filter_ties(df):
+    """Drop tie games"""
+    mask = df.loc[df['homeScore']!=df['awayScore']]
+    return mask
+
+
+def _add_columns(df):
+    """Add any additional columns we want as part of the View class"""
+    # Add the score: homeAwayScore and winningLosingScore
+    # (whole-column string operations, not a Python call per row)
+    score = lambda a, b: df[a].astype('int64').astype(str) + " - " + df[b].astype('int64').astype(str)
+    df = df.assign(**{
+        'winningLosingScore': score('winningScore', 'losingScore').values,
+        'homeAwayScore': score('homeScore', 'awayScore').values,
+    })
+    return df
+
+
+def build_games_frame(games_json=None, explain=NO_EXPLAIN):
+    """
+    Parse the bundled game history (or the given games JSON)
+    into a data frame, drop tie games, and add the score columns.
+    """
+    with explain.stage("load: parse JSON") as record:
+        if games_json is None:
+            games_json = get_games_data()
+        df = pd.read_json(io.StringIO(games_json))
+        record['rows'] = len(df)
+    with explain.stage("ties") as record:
+        df = _filter_ties(df)
+        record['rows'] = len(df)
+    with explain.stage("add_columns") as record:
+        df = _add_columns(df)
+        record['rows'] = len(df)
+    with explain.stage("compact dtypes") as record:
+        before = frame_nbytes(df)
+        df = compact_frame(df)
+        record['rows'] = len(df)
+        record['detail'] = "%.2f MiB -> %.2f MiB"%(before/2**20, frame_nbytes(df)/2**20)
+    return df.reset_index(drop=True)
+
+
+def stream_games_frame(seasons=None, postseason=False, teams=None, fields=None, games_json=None, explain=NO_EXPLAIN):
+    """
+    Stream the bundled game history (or the given games JSON) through
+    the user's filters (ties, season, postseason, team), building a data
+    frame from only the games and fields that survive, then add the score columns.
+    """
+    if fields is not None:
+        # The score columns are computed, not read
+        fields = [f for f in fields if f not in SCORE_COLUMNS]
+    with explain.stage("load: stream + filters") as record:
+        if games_json is None:
+            games_json = get_games_data()
+        columns = load_game_columns(games_json, game_filter(seasons, postseason, teams), fields)
+        if len(columns)==0:
+            # Nothing survived the filters, take the column names from the first game
+            first = next(iter_games(games_json), {})
+            columns = dict((f, []) for f in (fields or first.keys()))
+        df = pd.DataFrame(columns)
+        record['rows'] = len(df)
+    with explain.stage("add_columns") as record:
+        df = _add_columns(df)
+        df = compact_frame(df)
+        record['rows'] = len(df)
+        record['detail'] = "%d columns, %.2f MiB"%(len(df.columns), frame_nbytes(df)/2**20)
+    return df
+
+
+def load_games_frame(cache_dir=None, use_cache=True, explain=NO_EXPLAIN, columns=None, with_team_rows=False, seasons=None):
+    """
+    Load the (unfiltered) games data frame, from the on-disk
+    columnar cache if there is a valid one, otherwise by parsing
+    the game data (and populating the cache for next time).
+    If columns is given, only those columns are kept. If seasons
+    (0-indexed) is given, only those seasons' games are kept (only
+    their partitions of the cache are read).
+    If with_team_rows is True, return a tuple (data frame, TeamRows)
+    with the inverted team index of the frame (see team_rows.py).
+    """
+    team_rows = None
+    df = None
+    if use_cache:
+        with explain.stage("load: cache") as record:
+            cache = GamesCache(cache_dir)
+            df = cache.load(columns, seasons)
+            record['rows'] = 0 if df is None else len(df)
+            if df is not None:
+                record['detail'] = "%d of %d seasons, %s"%(
+                    len(cache.loaded), len(cache.seasons()), _projection_detail(df, sum(cache.column_nbytes().values())))
+                if with_team_rows:
+                    team_rows = cache.load_team_rows()
+            if cache.damaged:
+                # Parse the games again, and rewrite the damaged partitions
+                damaged = ", ".join(str(int(s)+1) for s in sorted(cache.damaged, key=int))
+                print("WARNING: Game data cache in %s is damaged (seasons %s), repairing it"%(cache.path, damaged), file=sys.stderr)
+                df, team_rows = None, None
+                record['rows'] = 0
+                record['detail'] = "damaged seasons: %s"%(damaged)
+
+    if df is None:
+        df = build_games_frame(explain=explain)
+        if use_cache:
+            try:
+                cache.save(df)
+            except OSError as e:
+                print("WARNING: Could not write game data cache to %s: %s"%(cache.cache_dir, e), file=sys.stderr)
+        with explain.stage("project columns") as record:
+            full_nbytes = frame_nbytes(df)
+            df = project_frame(df, columns)
+            if seasons is not None:
+                df = df.loc[df['season'].isin(seasons)].reset_index(drop=True)
+            record['rows'] = len(df)
+            record['detail'] = _projection_detail(df, full_nbytes)
+
+    if not with_team_rows:
+        return df
+    if team_rows is None:
+        with explain.stage("team index") as record:
+            team_rows = TeamRows.from_frame(df)
+            record['rows'] = len(df)
+    return (df, team_rows)
+
+
+def _projection_detail(df, full_nbytes):
+    """Describe the memory saved by keeping only some columns"""
+    nbytes = frame_nbytes(df)
+    return "%d columns, %.2f MiB (all columns: %.2f MiB, saved %.2f MiB)"%(
+        len(df.columns), nbytes/2**20, full_nbytes/2**20, (full_nbytes - nbytes)/2**20)
 
 
 class GameData(object):
@@ -88,38 +333,56 @@ class GameData(object):
     Data is filtered immediately on load, based on the data
     filters the user has specified in the config.
     """
-    def __init__(self, options):
-        """Load the data set into self.df"""
-        self.df = pd.read_json(gd.get_games_data())
+    def __init__(self, options, games=None, explain=NO_EXPLAIN, columns=None, team_rows=None):
+        """
+        Load the data set into self.df. If games is given, it is
+        used as the (unfiltered) games data frame instead of
+        loading the game data (e.g., the query server keeps it loaded),
+        and team_rows, if given, is its inverted team index.
+        If columns is given, only the columns needed to display
+        those columns are loaded. Stages are timed with explain, if given.
+        """
+        # Reasons to evaluate (built-in, or from the reasons file)
+        self.reasons = select_reasons(options.reason, options.reasons_file)
+        columns = needed_columns(columns, self.reasons)
 
         # Save options
         self.options = options
+        self.explain = explain
+        self.team_rows = None
 
-        # Drop tie games
-        self.df = self._filter_ties()
-
-        # Fiter data based on user configuration
-        self.df = self._season_filter_df(options.season)
-        self.df = self._postseason_filter_df(options.postseason)
-        self.df = self._team_filter_df(options.team)
-
-        # Add new columns
-        self._add_columns()
+        if games is None and options.no_cache:
+            # Without the cache, stream the game data and apply
+            # the filters while parsing (tie games are dropped and
+            # score columns are added on load)
+            self.df = stream_games_frame(options.season, options.postseason, options.team, columns, explain=explain)
+        else:
+            # Tie games are dropped and score columns are added on load
+            # (only the requested seasons are loaded)
+            loaded_seasons = games is None and 'all' not in options.season
+            if games is None:
+                seasons = None if 'all' in options.season else [int(s)-1 for s in options.season]
+                games, team_rows = load_games_frame(options.cache_dir, explain=explain, columns=columns,
+                                                    with_team_rows=True, seasons=seasons)
+            self.df = games
+            self.team_rows = team_rows if team_rows is not None and team_rows.nrows == len(games) else None
 
-    def _add_columns(self):
-        """Add any additional columns we want as part of the View class"""
-        # Add the score: homeAwayScore and winningLosingScore
-        wl_score_lambda = lambda x: "%d - %d"%(x['winningScore'], x['losingScore'])
-        wl_score_col = self.df[['winningScore', 'losingScore']].apply(wl_score_lambda, axis=1)
-        self.df = self.df.assign(**{'winningLosingScore': wl_score_col.values})
+            # Fiter data based on user configuration
+            # (the team filter goes first, while the team index
+            # positions still match the rows of the data frame)
+            with explain.stage("team") as record:
+                self.df = self._team_filter_df(options.team)
+                record['rows'] = len(self.df)
+                record['detail'] = "isin mask" if self.team_rows is None else "team index"
+            if not loaded_seasons:
+                with explain.stage("season") as record:
+                    self.df = self._season_filter_df(options.season)
+                    record['rows'] = len(self.df)
+            with explain.stage("postseason") as record:
+                self.df = self._postseason_filter_df(options.postseason)
+                record['rows'] = len(self.df)
 
-        ha_score_lambda = lambda x: "%d - %d"%(x['homeScore'], x['awayScore'])
-        ha_score_col = self.df[['homeScore', 'awayScore']].apply(ha_score_lambda, axis=1)
-        self.df = self.df.assign(**{'homeAwayScore': ha_score_col.values})
-
-    def _filter_ties(self):
-        mask = self.df.loc[self.df['homeScore']!=self.df['awayScore']]
-        return mask
+        check_reason_columns(self.df, self.reasons)
 
     def _season_filter_df(self, seasons):
         """
@@ -127,12 +390,11 @@ class GameData(object):
         (from the blaseball API) are zero-indexed.
         """
         if 'all' in seasons:
-            # Get all unique 0-indexed season values
-            seasons = list(set(self.df['season'].values))
-        else:
-            # User provides 1-indexed season values, so convert to 0-indexed
-            seasons = [int(s) for s in seasons]
-            seasons = [j-1 for j in seasons]
+            # Every season, nothing to filter
+            return self.df
+        # User provides 1-indexed season values, so convert to 0-indexed
+        seasons = [int(s) for s in seasons]
+        seasons = [j-1 for j in seasons]
         mask = self.df.loc[self.df['season'].isin(seasons)]
         return mask
 
@@ -148,26 +410,37 @@ class GameData(object):
 
     def _team_filter_df(self, teams):
         """
-        Filter game data on team(s).
+        Filter game data on team(s). With the inverted team index, this
+        takes the union of the teams' row positions instead of comparing
+        every row's team names against the list of teams.
         """
-        mask = self.df.loc[(self.df['homeTeamNickname'].isin(teams)) | (self.df['awayTeamNickname'].isin(teams))]
-        return mask
+        if self.team_rows is None:
+            mask = self.df.loc[(self.df['homeTeamNickname'].isin(teams)) | (self.df['awayTeamNickname'].isin(teams))]
+            return mask
+        if self.team_rows.covers(teams):
+            return self.df
+        return self.df.iloc[self.team_rows.lookup(teams)]
 
     def parse(self):
         """
         Parse game data to find interesting games matching reason param.
+        Each table is limited to the number of rows the views will show.
+        The tables are computed lazily, one reason at a time, so the
+        views can render each table as soon as it is ready.
 
-        Returns:
-        List of tuples [(string description, dataframe table data)]
+        Yields:
+        Tuples (string reason, dataframe table data)
         """
-        reason = self.options.reason
-        result = []
-        r2f = REASON2FUNCTION
-        if reason in r2f.keys():
-            # Return a list of tuples containing:
-            # - description of table (reason games are interesting)
-            # - table data (pandas dataframe)
-            funcs = r2f[reason]
-            for func in funcs:
-                result.append(func(self.df))
-        return result
+        n = ranked_rows(self.options)
+        if len(self.reasons) > 1:
+            # Evaluate all reasons together, sharing masks and subsets
+            yield from iter_reasons(self.df, self.reasons, n, self.explain)
+            return
+        # Yield tuples containing:
+        # - reason games are interesting
+        # - table data (pandas dataframe)
+        for reason in self.reasons:
+            with self.explain.stage("reason: %s"%(reason.name)) as record:
+                table = reason_top(self.df, reason, n)
+                record['rows'] = len(table[1])
+            yield table
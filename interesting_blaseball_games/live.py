@@ -0,0 +1,249 @@
+import sys
+import json
+import heapq
+import pandas as pd
+from .game_data import GameData, game_reasons
+from .loader import game_filter
+from .util import ranked_rows
+from .explain import NO_EXPLAIN
+
+
+# Fields of a live game update that are copied into the game record,
+# and the fields that are split into winning/losing fields
+LIVE_FIELDS = ['id', 'season', 'day', 'isPostseason', 'shame']
+SIDE_FIELDS = ['TeamName', 'TeamNickname', 'TeamEmoji', 'PitcherName', 'Score', 'Odds']
+
+
+def completed_game_record(update):
+    """
+    Turn a completed game from the live game feed into a game record
+    with the same fields as the bundled game history (including the
+    winning/losing fields, run differential, and score columns).
+    """
+    game = dict((k, update.get(k)) for k in LIVE_FIELDS)
+    for side in ['home', 'away']:
+        for k in SIDE_FIELDS:
+            game[side + k] = update.get(side + k)
+    if game['isPostseason'] is None:
+        game['isPostseason'] = False
+    if game['shame'] is None:
+        game['shame'] = False
+
+    winner, loser = ('home', 'away') if game['homeScore'] >= game['awayScore'] else ('away', 'home')
+    for k in SIDE_FIELDS:
+        game['winning' + k] = game[winner + k]
+        game['losing' + k] = game[loser + k]
+    game['runDiff'] = abs(game['homeScore'] - game['awayScore'])
+    game['winningLosingScore'] = "%d - %d"%(game['winningScore'], game['losingScore'])
+    game['homeAwayScore'] = "%d - %d"%(game['homeScore'], game['awayScore'])
+    return game
+
+
+def schedule_games(data):
+    """
+    Get the completed games from one message of the live game feed.
+    Accepts the streamData layout ({"value": {"games": {"schedule": [...]}}})
+    and the bare layouts ({"games": {"schedule": ...}} or {"schedule": ...}).
+    Yields: game records
+    """
+    value = data.get('value', data)
+    games = value.get('games', value)
+    for update in games.get('schedule', []):
+        if update.get('gameComplete'):
+            yield completed_game_record(update)
+
+
+def iter_feed_games(url):
+    """
+    Subscribe to the server-sent events game feed at url.
+    Yields: list of completed game records in each message
+    (completed games are repeated in later messages, callers
+    should ignore games they have already seen)
+    """
+    from sseclient import SSEClient
+    for message in SSEClient(url):
+        if not message.data:
+            continue
+        try:
+            data = json.loads(message.data)
+        except ValueError:
+            print("WARNING: Skipping malformed message from live feed", file=sys.stderr)
+            continue
+        yield list(schedule_games(data))
+
+
+class SortValue(object):
+    """
+    One sort key of a game, ordered the way sort_values orders it:
+    ascending or descending, with missing values last. Works for
+    strings as well as numbers (no negation needed for descending).
+    """
+    __slots__ = ('value', 'ascending', 'missing')
+
+    def __init__(self, value, ascending):
+        self.value = value
+        self.ascending = ascending
+        self.missing = value is None or value != value
+
+    def __eq__(self, other):
+        if self.missing or other.missing:
+            return self.missing and other.missing
+        return self.value == other.value
+
+    def __lt__(self, other):
+        if self.missing or other.missing:
+            return other.missing and not self.missing
+        return self.value < other.value if self.ascending else other.value < self.value
+
+
+class Worst(object):
+    """Reverses the order of a rank, so a (min) heap keeps the worst game at its root"""
+    __slots__ = ('rank',)
+
+    def __init__(self, rank):
+        self.rank = rank
+
+    def __eq__(self, other):
+        return self.rank == other.rank
+
+    def __lt__(self, other):
+        return other.rank < self.rank
+
+
+class TopN(object):
+    """
+    The top n games for one reason, kept in a bounded heap.
+
+    Games are ranked with the reason's sort keys, with ties broken
+    by insertion sequence, which gives the same order as the stable
+    sort in sort_top. The heap root is the worst game kept, so adding a
+    game is O(log n) no matter how many games have been seen.
+    """
+    def __init__(self, reason, n=None):
+        self.reason = reason
+        self.n = n
+        self.heap = []
+
+    def rank(self, game, seq):
+        """
+        Rank of a game (smaller is better). Missing values sort last,
+        as they do in sort_values.
+        """
+        rank = [SortValue(game.get(col), asc) for col, asc in zip(self.reason.by, self.reason.ascending)]
+        rank.append(seq)
+        return tuple(rank)
+
+    def push(self, game, seq):
+        """
+        Offer a game to the table.
+        Returns: True if the game made it into the top n
+        """
+        item = (Worst(self.rank(game, seq)), game)
+        if self.n is None or len(self.heap) < self.n:
+            heapq.heappush(self.heap, item)
+            return True
+        # Keep the game only if it ranks better than the worst game kept
+        if self.n <= 0 or not (self.heap[0][0] < item[0]):
+            return False
+        heapq.heapreplace(self.heap, item)
+        return True
+
+    def games(self):
+        """Get the games kept, best first"""
+        return [game for _, game in sorted(self.heap, reverse=True)]
+
+
+class LiveGameData(object):
+    """
+    Game data that grows as games complete on the live game feed.
+
+    The tables for each reason are seeded from the game history
+    (a GameData), and each new game that passes the user's filters is
+    offered to every reason it qualifies for, so the tables stay up to
+    date without sorting the whole data set again.
+    Has the same parse() method as GameData, so the views can render it.
+    """
+    def __init__(self, options, game_data=None, explain=NO_EXPLAIN):
+        if game_data is None:
+            game_data = GameData(options, explain=explain)
+        self.options = options
+        self.reasons = game_data.reasons
+        self.columns = list(game_data.df.columns)
+        self.keep = game_filter(options.season, options.postseason, options.team)
+
+        # Completed games received from the live feed, in order
+        self.new_games = []
+        self.seen_ids = set()
+
+        # Seed each table with the top games from the history. Rows are
+        # sequenced by their position in the history, new games come after.
+        self.tables = []
+        for reason, (_, df) in zip(self.reasons, game_data.parse()):
+            top = TopN(reason, ranked_rows(options))
+            for seq, game in zip(df.index, df.to_dict('records')):
+                top.push(game, seq)
+            self.tables.append(top)
+        self.seq = int(game_data.df.index.max()) + 1 if len(game_data.df) else 0
+
+    def add_game(self, game):
+        """
+        Add a completed game from the live feed.
+        Returns: True if any table changed
+        """
+        if game.get('id') in self.seen_ids:
+            return False
+        self.seen_ids.add(game.get('id'))
+        if not self.keep(game):
+            return False
+
+        self.new_games.append(game)
+        reasons = game_reasons(game, self.reasons)
+        changed = False
+        for top in self.tables:
+            if reasons[top.reason.name]:
+                changed = top.push(game, self.seq) or changed
+        self.seq += 1
+        return changed
+
+    def parse(self):
+        """
+        Get the current tables.
+        Returns: list of tuples [(string reason, dataframe table data)]
+        """
+        return [(top.reason.name, pd.DataFrame(top.games(), columns=self.columns)) for top in self.tables]
+
+
+def run_live(options, explain=NO_EXPLAIN):
+    """
+    Render the tables, then follow the live game feed at options.live
+    and render them again each time a new game changes a table.
+    """
+    from rich.console import Console
+    from .view import RichView, MarkdownView
+
+    if options.markdown:
+        view = MarkdownView(options, explain=explain)
+    else:
+        view = RichView(options, explain=explain)
+    live_data = LiveGameData(options, view.game_data)
+    view.game_data = live_data
+
+    console = Console()
+
+    def render():
+        if not options.markdown:
+            console.clear()
+        # (with --output, each refresh replaces the output file)
+        view.make_table()
+        print("Following live games from %s (%d new games)"%(options.live, len(live_data.new_games)), file=sys.stderr)
+
+    render()
+    try:
+        for games in iter_feed_games(options.live):
+            changed = False
+            for game in games:
+                changed = live_data.add_game(game) or changed
+            if changed:
+                render()
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,98 @@
+import re
+import json
+
+
+WHITESPACE = re.compile(r'[ \t\n\r]*')
+
+
+def parse_float(text):
+    """
+    Parse a JSON number with a fraction the way pd.read_json does
+    (integer part plus the fraction digits times a power of ten), so
+    the streamed games have the same odds, to the last bit, as the
+    games read with pandas (e.g. 0.575 parses as 0.5750000000000001)
+    """
+    mantissa, e, exponent = text.lower().partition('e')
+    if e:
+        return float(text)
+    negative = mantissa.startswith('-')
+    whole, _, fraction = mantissa.lstrip('-').partition('.')
+    value = int(whole) + (int(fraction)*10.0**-len(fraction) if fraction else 0.0)
+    return -value if negative else value
+
+
+def iter_games(games_json):
+    """
+    Incrementally parse a JSON array of game records,
+    yielding one game (dict) at a time, so the full list
+    of records is never held in memory at once.
+    """
+    decoder = json.JSONDecoder(parse_float=parse_float)
+    idx = WHITESPACE.match(games_json, 0).end()
+    if games_json[idx:idx+1] != '[':
+        raise Exception("Error: game data is not a JSON array")
+    idx = WHITESPACE.match(games_json, idx+1).end()
+    if games_json[idx:idx+1] == ']':
+        return
+    while True:
+        game, idx = decoder.raw_decode(games_json, idx)
+        yield game
+        idx = WHITESPACE.match(games_json, idx).end()
+        c = games_json[idx:idx+1]
+        if c == ']':
+            return
+        elif c != ',':
+            raise Exception("Error: malformed game data at character %d"%(idx))
+        idx = WHITESPACE.match(games_json, idx+1).end()
+
+
+def game_filter(seasons=None, postseason=False, teams=None):
+    """
+    Build a predicate that decides whether a single game record
+    survives the user's filters: ties are always dropped, then
+    season (1-indexed, or None/'all' for all seasons), postseason,
+    and team filters are applied, cheapest first.
+    """
+    if seasons is None or 'all' in seasons:
+        season_set = None
+    else:
+        # User provides 1-indexed season values, game data is 0-indexed
+        season_set = set(int(s)-1 for s in seasons)
+    team_set = None if teams is None else set(teams)
+
+    def keep(game):
+        if game['homeScore'] == game['awayScore']:
+            return False
+        if season_set is not None and game['season'] not in season_set:
+            return False
+        if postseason and game['isPostseason'] is not True:
+            return False
+        if team_set is not None:
+            if game['homeTeamNickname'] not in team_set and game['awayTeamNickname'] not in team_set:
+                return False
+        return True
+
+    return keep
+
+
+def load_game_columns(games_json, keep=None, fields=None):
+    """
+    Stream the game records through the predicate keep, and build
+    columns only for the games and fields that survive.
+    If fields is None, every field that appears in a surviving game is kept.
+
+    Returns: dict mapping field name to list of values
+    """
+    columns = dict((f, []) for f in (fields or []))
+    nrows = 0
+    for game in iter_games(games_json):
+        if keep is not None and not keep(game):
+            continue
+        if fields is None:
+            for f in game:
+                if f not in columns:
+                    columns[f] = [None]*nrows
+        for f, column in columns.items():
+            column.append(game.get(f))
+        nrows += 1
+    return columns
@@ -0,0 +1,81 @@
+import os
+import stat
+import tempfile
+import contextlib
+
+
+# What to do when an output file already exists
+IF_EXISTS_CHOICES = ['overwrite', 'error']
+
+# Formats for exporting complete results
+EXPORT_CHOICES = ['csv', 'ndjson', 'parquet', 'html']
+
+# Write buffer size for output files
+BUFFER_SIZE = 1 << 16
+
+
+def check_output_file(path, if_exists='overwrite'):
+    """
+    Check that an output file can be written: its directory must exist,
+    and if the file already exists, the if_exists policy must allow
+    overwriting it.
+    """
+    directory = os.path.abspath(os.path.dirname(path))
+    if not os.path.exists(directory):
+        raise Exception("Error: directory for output file (%s) does not exist!"%(directory))
+    if if_exists not in IF_EXISTS_CHOICES:
+        raise Exception("Error: if_exists must be one of: %s"%(", ".join(IF_EXISTS_CHOICES)))
+    if if_exists == 'error' and os.path.exists(path):
+        raise Exception("Error: output file %s already exists (use --if-exists overwrite to replace it)"%(path))
+
+
+# Permissions for a new file (what open() would use under the umask).
+# The umask can only be read by setting it, so this is done once, at
+# import time, before the server or the refresh thread start any threads
+_UMASK = os.umask(0)
+os.umask(_UMASK)
+NEW_FILE_MODE = 0o666 & ~_UMASK
+
+
+def _output_file_mode(path):
+    """Permissions for an output file: those of the file it replaces, if there is one"""
+    try:
+        return stat.S_IMODE(os.stat(path).st_mode)
+    except OSError:
+        return NEW_FILE_MODE
+
+
+@contextlib.contextmanager
+def atomic_output(path, if_exists='overwrite', binary=False):
+    """
+    Open an output file for writing, atomically: everything is written
+    through one buffered file object to a temporary file in the same
+    directory, which is renamed over path only once the block finishes.
+    If the block raises, the temporary file is removed, and any existing
+    file at path is left untouched. A file that is replaced keeps its
+    permissions. The file is opened as UTF-8 text, or in binary mode
+    if binary is True.
+
+        with atomic_output("blowouts.md") as f:
+            f.write(...)
+    """
+    check_output_file(path, if_exists)
+    directory = os.path.abspath(os.path.dirname(path))
+    fd, tmp_path = tempfile.mkstemp(prefix="." + os.path.basename(path) + ".", suffix=".tmp", dir=directory)
+    try:
+        if binary:
+            f = os.fdopen(fd, 'wb', buffering=BUFFER_SIZE)
+        else:
+            f = os.fdopen(fd, 'w', encoding='utf-8', buffering=BUFFER_SIZE)
+        with f:
+            yield f
+            f.flush()
+            os.fsync(f.fileno())
+        os.chmod(tmp_path, _output_file_mode(path))
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.unlink(tmp_path)
+        except OSError:
+            pass
+        raise
@@ -0,0 +1,55 @@
+import os
+import sys
+import copy
+from .game_data import GameData, team_reasons
+from .explain import NO_EXPLAIN
+from .output import atomic_output, check_output_file
+from .view import MarkdownView
+from .util import ranked_rows
+
+
+class TeamGameData(object):
+    """
+    Stand-in for GameData holding the tables already
+    computed for one team (has the same parse() method)
+    """
+    def __init__(self, options, df, tables):
+        self.options = options
+        self.df = df
+        self.tables = tables
+
+    def parse(self):
+        return self.tables
+
+
+def team_report_filename(team):
+    """Name of the Markdown file for a team's report"""
+    return team.replace(' ', '_') + ".md"
+
+
+def run_per_team(options, explain=NO_EXPLAIN):
+    """
+    Write one Markdown file per team to the directory options.per_team.
+    The game data is loaded and filtered once (for all of the teams),
+    and every reason is evaluated for every team in the same pass.
+    """
+    outdir = options.per_team
+    if not os.path.isdir(outdir):
+        raise Exception("Error: directory for per-team reports (%s) does not exist!"%(os.path.abspath(outdir)))
+
+    teams = list(options.team)
+    for team in teams:
+        check_output_file(os.path.join(outdir, team_report_filename(team)), options.if_exists)
+    game_data = GameData(options, explain=explain)
+    tables = team_reasons(game_data.df, teams, game_data.reasons, ranked_rows(options), explain)
+
+    for team in teams:
+        team_options = copy.copy(options)
+        team_options.team = [team]
+        team_options.output = ''
+        view = MarkdownView(team_options, TeamGameData(team_options, game_data.df, tables[team]))
+        with explain.stage("render: %s"%(team)) as record:
+            with atomic_output(os.path.join(outdir, team_report_filename(team)), options.if_exists) as f:
+                f.write(view.to_markdown())
+            record['rows'] = sum(view.shown_rows(df) for _, df in tables[team])
+    print("Wrote %d team reports to %s"%(len(teams), outdir), file=sys.stderr)
@@ -0,0 +1,244 @@
+import ast
+import configparser
+from collections import OrderedDict
+
+
+class Reason(object):
+    """
+    A reason that a game is interesting, defined declaratively:
+
+    * predicate: expression selecting the games that qualify, in
+      DataFrame.eval syntax (e.g. "winningOdds < 0.46"), or None for all games
+    * by, ascending: sort keys and directions ranking the games
+    * description: start of the table description
+
+    The predicate is compiled once into a single vectorized expression
+    over the columns' numpy arrays, so every reason (built-in or
+    user-defined) is evaluated the same way and at the same speed.
+    """
+    def __init__(self, name, predicate, by, ascending, description):
+        self.name = name
+        self.predicate = predicate
+        self.by = list(by)
+        self.ascending = list(ascending)
+        self.description = description
+        if len(self.by) == 0 or len(self.by) != len(self.ascending):
+            raise Exception("Error: reason %s needs one sort direction for each of its sort keys"%(name))
+        self.code, self.predicate_columns = compile_predicate(name, predicate)
+        # Columns the reason needs, for loading only the columns a query uses
+        self.columns = self.predicate_columns + [c for c in self.by if c not in self.predicate_columns]
+
+    def mask(self, df):
+        """
+        Evaluate the compiled predicate on the data frame's columns
+        (a pandas DataFrame, or an ArrayTable, see array_engine.py).
+        Returns: boolean array, or None if every game qualifies
+        """
+        if self.code is None:
+            return None
+        import numpy as np
+        columns = dict((c, np.asarray(df[c])) for c in self.predicate_columns)
+        try:
+            result = eval(self.code, {'__builtins__': {}, '_isin': np.isin}, columns)
+        except Exception as e:
+            raise Exception("Error: could not evaluate predicate for reason %s (%s): %s"%(self.name, self.predicate, e))
+        result = np.asarray(result, dtype=bool)
+        if result.shape != (len(df),):
+            raise Exception("Error: predicate for reason %s (%s) does not depend on any column"%(self.name, self.predicate))
+        return result
+
+    def __repr__(self):
+        return "Reason(%r, %r, %r, %r)"%(self.name, self.predicate, self.by, self.ascending)
+
+
+class _Vectorize(ast.NodeTransformer):
+    """
+    Rewrite a DataFrame.eval style expression so that it evaluates
+    element-wise on numpy arrays: and/or/not become &/|/~, chained
+    comparisons are split, and "x in [...]" becomes an isin call.
+    """
+    # Nodes allowed in a predicate (anything else is rejected)
+    ALLOWED = (
+        ast.Expression, ast.BoolOp, ast.BinOp, ast.UnaryOp, ast.Compare,
+        ast.Name, ast.Constant, ast.List, ast.Tuple, ast.Load,
+        ast.And, ast.Or, ast.Not, ast.Invert, ast.USub, ast.UAdd,
+        ast.Add, ast.Sub, ast.Mult, ast.Div, ast.FloorDiv, ast.Mod, ast.Pow,
+        ast.BitAnd, ast.BitOr, ast.BitXor,
+        ast.Eq, ast.NotEq, ast.Lt, ast.LtE, ast.Gt, ast.GtE, ast.In, ast.NotIn,
+    )
+
+    def visit_BoolOp(self, node):
+        op = ast.BitAnd() if isinstance(node.op, ast.And) else ast.BitOr()
+        values = [self.visit(v) for v in node.values]
+        result = values[0]
+        for v in values[1:]:
+            result = ast.BinOp(left=result, op=op, right=v)
+        return result
+
+    def visit_UnaryOp(self, node):
+        operand = self.visit(node.operand)
+        if isinstance(node.op, ast.Not):
+            return ast.UnaryOp(op=ast.Invert(), operand=operand)
+        return ast.UnaryOp(op=node.op, operand=operand)
+
+    def visit_Compare(self, node):
+        left = self.visit(node.left)
+        parts = []
+        for op, right in zip(node.ops, node.comparators):
+            right = self.visit(right)
+            if isinstance(op, (ast.In, ast.NotIn)):
+                part = ast.Call(func=ast.Name(id='_isin', ctx=ast.Load()), args=[left, right], keywords=[])
+                if isinstance(op, ast.NotIn):
+                    part = ast.UnaryOp(op=ast.Invert(), operand=part)
+            else:
+                part = ast.Compare(left=left, ops=[op], comparators=[right])
+            parts.append(part)
+            left = right
+        result = parts[0]
+        for part in parts[1:]:
+            result = ast.BinOp(left=result, op=ast.BitAnd(), right=part)
+        return result
+
+
+def compile_predicate(name, predicate):
+    """
+    Compile a predicate into a code object that evaluates it on
+    numpy arrays named after the columns.
+    Returns: tuple (code object or None, list of column names used, in order)
+    """
+    if predicate is None:
+        return (None, [])
+    try:
+        tree = ast.parse(predicate, mode='eval')
+    except SyntaxError as e:
+        raise Exception("Error: could not parse predicate for reason %s (%s): %s"%(name, predicate, e))
+    columns = []
+    for node in ast.walk(tree):
+        if not isinstance(node, _Vectorize.ALLOWED):
+            raise Exception("Error: predicate for reason %s (%s) may only use columns, constants, comparisons and operators"%(name, predicate))
+        if isinstance(node, ast.Name) and node.id not in columns:
+            columns.append(node.id)
+    tree = ast.fix_missing_locations(_Vectorize().visit(tree))
+    return (compile(tree, "<reason %s>"%(name), 'eval'), columns)
+
+
+def reason_masks(df, reasons):
+    """
+    Compute the row mask for every reason, evaluating each
+    distinct predicate only once (reasons with the same predicate
+    share the same mask object).
+    Returns: dict mapping reason name to boolean array (None means all rows)
+    """
+    by_predicate = {}
+    masks = {}
+    for reason in reasons:
+        if reason.predicate not in by_predicate:
+            by_predicate[reason.predicate] = reason.mask(df)
+        masks[reason.name] = by_predicate[reason.predicate]
+    return masks
+
+
+def check_reason_columns(df, reasons):
+    """Make sure every column the reasons use is in the game data (a data frame or ArrayTable)"""
+    for reason in reasons:
+        missing = [c for c in reason.columns if c not in df.columns]
+        if missing:
+            raise Exception("Error: reason %s uses unknown column(s): %s"%(reason.name, ", ".join(missing)))
+
+
+def parse_sort(name, text):
+    """
+    Parse a sort specification like "runDiff desc, winningScore desc, season, day".
+    Returns: tuple (list of sort keys, list of ascending flags)
+    """
+    by, ascending = [], []
+    for item in text.split(','):
+        words = item.split()
+        if len(words) == 0:
+            continue
+        if len(words) > 2 or (len(words) == 2 and words[1].lower() not in ('asc', 'desc')):
+            raise Exception("Error: could not parse sort key '%s' for reason %s (use: column [asc|desc], ...)"%(item.strip(), name))
+        by.append(words[0])
+        ascending.append(len(words) == 1 or words[1].lower() == 'asc')
+    return (by, ascending)
+
+
+BUILTIN_REASONS = [
+    Reason('blowout', None,
+           ['winningScore', 'runDiff', 'season', 'day'], [False, False, True, True],
+           "Blowout games (games with high scores and high run differentials)"),
+    Reason('shutout', "losingScore == 0",
+           ['runDiff', 'season', 'day'], [False, True, True],
+           "Shutout games (games where the loser had zero runs)"),
+    Reason('shame', "shame == True",
+           ['runDiff', 'winningScore', 'season', 'day'], [False, False, True, True],
+           "Shame games (games where the loser was shamed)"),
+    Reason('underdog', "winningOdds < 0.46",
+           ['runDiff', 'winningScore'], [False, False],
+           "Underdog games (games where the underdog won with large run differential)"),
+    Reason('maxedout', "runDiff == 1",
+           ['winningScore', 'season', 'day'], [False, True, True],
+           "Maxed out games (high-scoring one-run games)"),
+    Reason('defensive', "runDiff == 1",
+           ['winningScore', 'season', 'day'], [True, True, True],
+           "Defensive games (low-scoring one-run games)"),
+]
+
+
+def load_reasons_file(path):
+    """
+    Load reason definitions from an INI file, one section per reason:
+
+        [comeback]
+        predicate = winningOdds < 0.3 and runDiff >= 5
+        sort = runDiff desc, winningScore desc, season, day
+        description = Comeback games (heavy underdogs winning big)
+
+    The predicate may be left out (every game qualifies).
+    Returns: list of Reasons
+    """
+    parser = configparser.ConfigParser(interpolation=None)
+    try:
+        with open(path, 'r') as f:
+            parser.read_file(f)
+    except (OSError, configparser.Error) as e:
+        raise Exception("Error: could not read reasons file %s: %s"%(path, e))
+
+    reasons = []
+    for name in parser.sections():
+        section = parser[name]
+        if name == 'all':
+            raise Exception("Error: 'all' is not a valid reason name (in %s)"%(path))
+        if 'sort' not in section:
+            raise Exception("Error: reason %s in %s has no sort keys"%(name, path))
+        by, ascending = parse_sort(name, section['sort'])
+        predicate = section.get('predicate', '').strip() or None
+        description = section.get('description', "%s games"%(name.capitalize()))
+        reasons.append(Reason(name, predicate, by, ascending, description))
+    return reasons
+
+
+def get_reasons(reasons_file=None):
+    """
+    Get every reason: the built-in reasons, then the reasons in
+    reasons_file (a reason with the same name as a built-in
+    reason replaces it). Returns: OrderedDict of name to Reason
+    """
+    reasons = OrderedDict((r.name, r) for r in BUILTIN_REASONS)
+    if reasons_file:
+        for r in load_reasons_file(reasons_file):
+            reasons[r.name] = r
+    return reasons
+
+
+def select_reasons(reason, reasons_file=None):
+    """
+    Get the reasons to evaluate for the --reason option
+    ('all' means every reason). Returns: list of Reasons
+    """
+    reasons = get_reasons(reasons_file)
+    if reason == 'all':
+        return list(reasons.values())
+    if reason not in reasons:
+        raise Exception("Error: reason not recognized. Valid reasons: %s"%(", ".join(list(reasons.keys()) + ['all'])))
+    return [reasons[reason]]
@@ -0,0 +1,166 @@
+import os
+import sys
+import json
+import time
+import asyncio
+import hashlib
+from .datasource import get_data_dir, read_data_manifest, DATA_FILES, DATA_MANIFEST
+from .output import atomic_output
+
+# Fields every game record must have
+REQUIRED_GAME_FIELDS = ['id', 'season', 'day', 'isPostseason', 'homeTeamNickname', 'awayTeamNickname',
+                        'homeScore', 'awayScore', 'winningScore', 'losingScore', 'runDiff']
+
+# Seconds to wait for each download
+FETCH_TIMEOUT = 60
+
+
+def source_urls(source):
+    """Get the URL of each data file at the refresh source (a base URL)"""
+    return dict((name, source.rstrip('/') + '/' + fname) for name, fname in DATA_FILES.items())
+
+
+def fetch(url, etag=None, last_modified=None, timeout=FETCH_TIMEOUT):
+    """
+    Download url with a conditional GET: if the ETag or the
+    Last-Modified date of the copy we have is given, the server
+    can answer 304 Not Modified instead of sending the data again.
+    Returns: tuple (status, body bytes or None, etag, last modified)
+    """
+    import requests
+    headers = {}
+    if etag:
+        headers['If-None-Match'] = etag
+    if last_modified:
+        headers['If-Modified-Since'] = last_modified
+    try:
+        r = requests.get(url, headers=headers, timeout=timeout)
+    except requests.RequestException as e:
+        raise Exception("Error: could not fetch %s: %s"%(url, e))
+    if r.status_code == 304:
+        return (304, None, etag, last_modified)
+    if r.status_code != 200:
+        raise Exception("Error: could not fetch %s: HTTP %d"%(url, r.status_code))
+    return (200, r.content, r.headers.get('ETag'), r.headers.get('Last-Modified'))
+
+
+async def fetch_all(urls, previous, timeout=FETCH_TIMEOUT):
+    """
+    Download every data file at once (each blocking download runs in
+    its own thread, and asyncio waits for all of them together).
+    previous maps names to the manifest entries of the copies we have.
+    Returns: dict of name to the result of fetch
+    """
+    names = list(urls.keys())
+    tasks = []
+    for name in names:
+        entry = previous.get(name) or {}
+        conditional = entry.get('url') == urls[name]
+        tasks.append(asyncio.to_thread(fetch, urls[name],
+                                       entry.get('etag') if conditional else None,
+                                       entry.get('last_modified') if conditional else None,
+                                       timeout))
+    results = await asyncio.gather(*tasks)
+    return dict(zip(names, results))
+
+
+def validate_games(text):
+    """Make sure downloaded games data is a JSON list of game records"""
+    games = json.loads(text)
+    if not isinstance(games, list) or len(games) == 0:
+        raise ValueError("expected a non-empty list of games")
+    for game in games:
+        if not isinstance(game, dict):
+            raise ValueError("expected every game to be an object")
+        missing = [f for f in REQUIRED_GAME_FIELDS if f not in game]
+        if missing:
+            raise ValueError("game %s is missing field(s): %s"%(game.get('id', '?'), ", ".join(missing)))
+
+
+def validate_teams(text):
+    """Make sure downloaded teams data can be indexed and lists some teams"""
+    from .util import TeamIndex
+    seasons = json.loads(text)
+    if not isinstance(seasons, list) or len(seasons) == 0:
+        raise ValueError("expected a non-empty list of seasons")
+    try:
+        team_index = TeamIndex(seasons)
+    except (KeyError, TypeError, AttributeError) as e:
+        raise ValueError("could not index teams (%s)"%(e))
+    if len(team_index.teams) == 0:
+        raise ValueError("no teams found")
+
+
+VALIDATORS = {'games': validate_games, 'teams': validate_teams}
+
+
+def refresh_data(source, data_dir=None, timeout=FETCH_TIMEOUT):
+    """
+    Refresh the game and team data from source (a base URL serving
+    games.json and teams.json). Files that have not changed since the
+    last refresh are not downloaded again (conditional requests), and
+    new files are validated before anything is replaced. New files are
+    written next to the old ones, then the manifest is replaced
+    atomically, so readers see either the old data or the new data
+    (the old files are removed by the next refresh that changes data).
+    Returns: list of the names of the data sets that changed
+    """
+    data_dir = get_data_dir(data_dir)
+    os.makedirs(data_dir, exist_ok=True)
+    manifest = read_data_manifest(data_dir) or {'files': {}}
+    urls = source_urls(source)
+    results = asyncio.run(fetch_all(urls, manifest['files'], timeout))
+
+    # Validate everything before replacing anything
+    files = dict(manifest['files'])
+    new_bodies = {}
+    now = time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime())
+    for name, (status, body, etag, last_modified) in results.items():
+        entry = dict(files.get(name) or {})
+        entry.update({'url': urls[name], 'etag': etag, 'last_modified': last_modified, 'checked': now})
+        if status == 200:
+            try:
+                VALIDATORS[name](body.decode('utf-8'))
+            except ValueError as e:
+                raise Exception("Error: %s data from %s is not valid: %s"%(name, urls[name], e))
+            sha256 = hashlib.sha256(body).hexdigest()
+            if sha256 != entry.get('sha256'):
+                entry.update({'file': "%s-%s.json"%(name, sha256[:16]), 'sha256': sha256, 'updated': now})
+                new_bodies[name] = body
+        files[name] = entry
+
+    # The files replaced by this refresh are kept until the next refresh that changes
+    # something, so a reader that read the old manifest can still read them
+    used = set(entry['file'] for entry in files.values() if 'file' in entry)
+    previous = manifest.get('previous', [])
+    if new_bodies:
+        old_used = set(entry['file'] for entry in manifest['files'].values() if 'file' in entry)
+        previous = sorted(old_used - used)
+
+    for name, body in new_bodies.items():
+        with atomic_output(os.path.join(data_dir, files[name]['file']), binary=True) as f:
+            f.write(body)
+    with atomic_output(os.path.join(data_dir, DATA_MANIFEST)) as f:
+        json.dump({'source': source, 'files': files, 'previous': previous}, f, indent=2)
+
+    # Remove data files older than that
+    keep = used | set(previous)
+    for fname in os.listdir(data_dir):
+        if fname.endswith('.json') and fname != DATA_MANIFEST and fname not in keep \
+                and any(fname.startswith(name + '-') for name in DATA_FILES):
+            os.unlink(os.path.join(data_dir, fname))
+    return sorted(new_bodies.keys())
+
+
+def run_refresh(options):
+    """Refresh the data once (--refresh) and report what changed"""
+    if not options.refresh_source:
+        raise Exception("Error: --refresh needs a --refresh-source URL")
+    t0 = time.perf_counter()
+    changed = refresh_data(options.refresh_source)
+    elapsed = time.perf_counter() - t0
+    if changed:
+        print("Refreshed %s data in %s (%.2f s)"%(" and ".join(changed), get_data_dir(), elapsed), file=sys.stderr)
+    else:
+        print("Data in %s is up to date (%.2f s)"%(get_data_dir(), elapsed), file=sys.stderr)
+    return changed
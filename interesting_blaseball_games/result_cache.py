@@ -0,0 +1,186 @@
+import os
+import sys
+import json
+import shutil
+import hashlib
+import numpy as np
+from .cache import get_cache_dir, get_data_version
+from .explain import NO_EXPLAIN
+from .output import atomic_output
+from .reasons import select_reasons
+from .util import get_team_index, ranked_rows, RESULT_CACHE_SIZE
+
+
+# Bump this whenever the layout of the cached results changes
+RESULT_CACHE_VERSION = 2
+
+
+def query_key(options, columns):
+    """
+    Get the canonical form of a query: everything that decides which
+    games end up in its tables, and nothing that only changes how they
+    are shown. Teams are sorted (and a list of every team is 'all'),
+    seasons are resolved to sorted season numbers, and the reasons are
+    identified by their definitions, so editing a reasons file changes
+    the key. Returns: dict
+    """
+    teams = sorted(set(options.team))
+    if get_team_index().is_all_teams(teams):
+        teams = 'all'
+    seasons = options.season
+    if 'all' in seasons:
+        seasons = 'all'
+    else:
+        seasons = sorted(set(int(s) for s in seasons))
+    reasons = [[r.name, r.predicate, r.by, r.ascending]
+               for r in select_reasons(options.reason, options.reasons_file)]
+    return {
+        'reasons': reasons,
+        'teams': teams,
+        'seasons': seasons,
+        'postseason': bool(options.postseason),
+        'rows': ranked_rows(options),
+        'columns': sorted(columns),
+    }
+
+
+class ResultCache(object):
+    """
+    On-disk cache of query results: the ranked tables of a query (only
+    the rows and columns the views show), keyed by the canonical form
+    of the query and the data version. A repeated query is answered
+    from its cached tables without loading the game data.
+
+    Each result is one small JSON file. Reading a result touches its
+    file, and when the files add up to more than the size cap, the
+    least recently used ones are removed.
+    """
+    def __init__(self, cache_dir=None, max_size=RESULT_CACHE_SIZE):
+        self.cache_dir = get_cache_dir(cache_dir)
+        self.path = os.path.join(self.cache_dir, "results-v%d"%(RESULT_CACHE_VERSION))
+        self.max_bytes = int(max_size*1024*1024)
+        self._data_version = None
+
+    @property
+    def data_version(self):
+        if self._data_version is None:
+            self._data_version = get_data_version()
+        return self._data_version
+
+    def key(self, options, columns):
+        """Get the cache key (a hash) of a query"""
+        query = query_key(options, columns)
+        query['data_version'] = self.data_version
+        return hashlib.sha256(json.dumps(query, sort_keys=True).encode('utf-8')).hexdigest()
+
+    def get(self, key):
+        """
+        Get the cached tables of a query, or None if it is not cached.
+        Returns: list of tuples [(string reason, ArrayTable table data)]
+        """
+        from .array_engine import ArrayTable
+        path = os.path.join(self.path, key + ".json")
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                result = json.load(f)
+            # Mark the result as recently used
+            os.utime(path)
+        except (OSError, ValueError):
+            return None
+        tables = []
+        for table in result['tables']:
+            data = dict((c, np.array(column['values'], dtype=column['dtype'])) for c, column in table['columns'].items())
+            tables.append((table['reason'], ArrayTable(data, list(data.keys()), table['nrows'])))
+        return tables
+
+    def put(self, key, tables, columns):
+        """
+        Save the tables of a query (only the given columns),
+        then evict the least recently used results over the size cap.
+        Returns: True if the tables were saved
+        """
+        result = {'tables': []}
+        for reason, df in tables:
+            table = {'reason': reason, 'nrows': len(df), 'columns': {}}
+            for c in columns:
+                values = np.asarray(df[c])
+                dtype = values.dtype.str if values.dtype.kind in 'biuf' else 'O'
+                table['columns'][c] = {'dtype': dtype, 'values': values.tolist()}
+            result['tables'].append(table)
+        try:
+            text = json.dumps(result)
+        except (TypeError, ValueError):
+            # Values that don't round-trip through JSON are not cached
+            return False
+        if len(text) > self.max_bytes:
+            return False
+        os.makedirs(self.path, exist_ok=True)
+        with atomic_output(os.path.join(self.path, key + ".json")) as f:
+            f.write(text)
+        self.evict()
+        return True
+
+    def evict(self):
+        """Remove the least recently used results until the cache fits its size cap"""
+        entries = []
+        for name in os.listdir(self.path):
+            if not name.endswith(".json"):
+                continue
+            try:
+                st = os.stat(os.path.join(self.path, name))
+            except OSError:
+                continue
+            entries.append((st.st_mtime_ns, st.st_size, name))
+        total = sum(size for _, size, _ in entries)
+        for _, size, name in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            try:
+                os.unlink(os.path.join(self.path, name))
+            except OSError:
+                pass
+            total -= size
+
+    def clear(self):
+        """Remove every cached result"""
+        if not os.path.isdir(self.cache_dir):
+            return
+        for name in os.listdir(self.cache_dir):
+            if name.startswith("results-"):
+                shutil.rmtree(os.path.join(self.cache_dir, name), ignore_errors=True)
+
+
+class CachedResults(object):
+    """
+    Stand-in for GameData that answers parse() from the result cache,
+    and only loads and ranks the game data (with load_game_data) when
+    the query is not cached yet.
+    """
+    def __init__(self, options, cache, columns, load_game_data, explain=NO_EXPLAIN):
+        self.options = options
+        self.cache = cache
+        self.columns = columns
+        self.load_game_data = load_game_data
+        self.explain = explain
+
+    def parse(self):
+        """
+        Yields:
+        Tuples (string reason, table data), one reason at a time
+        (the result is saved once every table has been computed)
+        """
+        with self.explain.stage("result cache") as record:
+            key = self.cache.key(self.options, self.columns)
+            tables = self.cache.get(key)
+            record['rows'] = 0 if tables is None else sum(len(df) for _, df in tables)
+        if tables is not None:
+            yield from tables
+            return
+        tables = []
+        for table in self.load_game_data().parse():
+            tables.append(table)
+            yield table
+        try:
+            self.cache.put(key, tables, self.columns)
+        except OSError as e:
+            print("WARNING: Could not write result cache to %s: %s"%(self.cache.path, e), file=sys.stderr)
@@ -0,0 +1,179 @@
+import os
+import sys
+import json
+import stat
+import time
+import threading
+import socketserver
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+from . import _program, __version__
+from .command import get_parser, process_options, QueryParser, QueryError, QUERY_KEYS, FLAG_KEYS
+from .game_data import GameData, load_games_frame
+from .view import MarkdownView
+from .util import get_team_index
+
+
+FORMAT_CHOICES = ['json', 'markdown']
+
+
+class QueryServer(object):
+    """
+    Keeps the (unfiltered) game data loaded, and answers queries
+    that use the same options as the command line tool.
+    With a refresh interval, the data is refreshed in the background
+    and swapped in (queries already running finish with the old data).
+    """
+    def __init__(self, options):
+        self.options = options
+        # (games data frame, team index), replaced as a whole on refresh
+        self.data = self.load()
+        self.refresher = None
+        if options.refresh_interval:
+            if not options.refresh_source:
+                raise Exception("Error: --refresh-interval needs a --refresh-source URL")
+            self.refresher = threading.Thread(target=self.refresh_loop, daemon=True)
+            self.refresher.start()
+
+    def load(self):
+        """Load the games data frame and its team index"""
+        return load_games_frame(self.options.cache_dir, not self.options.no_cache, with_team_rows=True)
+
+    def refresh_loop(self):
+        """Refresh the data every refresh interval, reloading it when it changes"""
+        from .refresh import refresh_data
+        while True:
+            time.sleep(self.options.refresh_interval)
+            try:
+                changed = refresh_data(self.options.refresh_source)
+                if changed:
+                    # Team names (and the query parser's choices) may have changed too
+                    get_team_index.cache_clear()
+                    self.data = self.load()
+                    print("Refreshed %s data (%d games)"%(" and ".join(changed), len(self.data[0])), file=sys.stderr)
+            except Exception as e:
+                print("WARNING: Could not refresh data from %s: %s"%(self.options.refresh_source, e), file=sys.stderr)
+
+    def query_to_args(self, query):
+        """
+        Turn a parsed query string (dict of lists) into
+        a list of command line arguments
+        """
+        args = []
+        for key, values in query.items():
+            if key == 'format':
+                continue
+            if key not in QUERY_KEYS:
+                raise QueryError("unrecognized query parameter: %s (valid parameters: %s)"%(key, ", ".join(QUERY_KEYS + ['format'])))
+            for value in values:
+                if key in FLAG_KEYS:
+                    if value.lower() in ['', 'true', 'yes', '1']:
+                        args.append('--' + key)
+                else:
+                    args += ['--' + key, value]
+        return args
+
+    def run_query(self, query):
+        """
+        Run a query and render the result.
+        Returns: tuple (string content type, string body)
+        """
+        fmt = query.get('format', ['json'])[-1]
+        if fmt not in FORMAT_CHOICES:
+            raise QueryError("format must be one of: %s"%(", ".join(FORMAT_CHOICES)))
+
+        p = get_parser(QueryParser)
+        options = p.parse_args(self.query_to_args(query))
+        # Queries can use the reasons defined in the server's reasons file
+        options.reasons_file = self.options.reasons_file
+        try:
+            options = process_options(options)
+        except Exception as e:
+            raise QueryError(str(e))
+
+        games, team_rows = self.data
+        view = MarkdownView(options, GameData(options, games, team_rows=team_rows))
+        if fmt == 'markdown':
+            return ('text/markdown; charset=utf-8', view.to_markdown())
+        else:
+            return ('application/json', json.dumps(view.table_data()))
+
+
+class QueryHandler(BaseHTTPRequestHandler):
+    """
+    Handle GET /query?reason=...&team=...&format=json|markdown
+    and GET /health requests
+    """
+    server_version = "%s/%s"%(_program, __version__)
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        if url.path == '/health':
+            self._send(200, 'text/plain; charset=utf-8', "ok\n")
+        elif url.path == '/query':
+            query = parse_qs(url.query, keep_blank_values=True)
+            try:
+                content_type, body = self.server.query_server.run_query(query)
+            except QueryError as e:
+                self._send_error(400, e)
+            except Exception as e:
+                self._send_error(500, e)
+            else:
+                self._send(200, content_type, body)
+        else:
+            self._send(404, 'text/plain; charset=utf-8', "Not found: use /query or /health\n")
+
+    def _send_error(self, code, e):
+        msg = str(e)
+        if not msg.startswith("Error"):
+            msg = "Error: " + msg
+        self._send(code, 'text/plain; charset=utf-8', msg + "\n")
+
+    def _send(self, code, content_type, body):
+        data = body.encode('utf-8')
+        self.send_response(code)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def address_string(self):
+        # Clients on a Unix socket have no address
+        if isinstance(self.client_address, tuple):
+            return super().address_string()
+        return "unix"
+
+
+class ThreadingUnixHTTPServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    """HTTP server on a Unix socket, one thread per request"""
+    daemon_threads = True
+
+
+def serve(options):
+    """
+    Load the game data, then answer queries over HTTP
+    (on a host and port, or a Unix socket) until interrupted
+    """
+    query_server = QueryServer(options)
+
+    if options.socket:
+        if os.path.exists(options.socket):
+            if not stat.S_ISSOCK(os.stat(options.socket).st_mode):
+                raise Exception("Error: %s exists and is not a socket"%(options.socket))
+            os.unlink(options.socket)
+        httpd = ThreadingUnixHTTPServer(options.socket, QueryHandler)
+        where = options.socket
+    else:
+        httpd = ThreadingHTTPServer((options.host, options.port), QueryHandler)
+        where = "http://%s:%d"%(options.host, options.port)
+    httpd.query_server = query_server
+
+    print("Serving queries on %s (press Ctrl-C to stop)"%(where), file=sys.stderr)
+    try:
+        httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        httpd.server_close()
+        if options.socket and os.path.exists(options.socket):
+            os.unlink(options.socket)
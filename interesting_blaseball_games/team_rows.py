@@ -0,0 +1,79 @@
+import numpy as np
+
+
+class TeamRows(object):
+    """
+    Inverted index from team nickname to the (sorted) positions of the
+    rows of the games data frame where the team played, at home or away.
+
+    The positions of every team are stored back to back in one int32
+    array, with offsets[i]:offsets[i+1] the slice belonging to teams[i],
+    so the index can be saved to and memory-mapped from the cache.
+    """
+    def __init__(self, teams, offsets, positions, nrows):
+        self.teams = list(teams)
+        self.offsets = offsets
+        self.positions = positions
+        self.nrows = nrows
+        self.slots = dict((team, i) for i, team in enumerate(self.teams))
+
+    @classmethod
+    def from_frame(cls, df):
+        """Build the index for a games data frame (rows are indexed by position)"""
+        import pandas as pd
+        n = len(df)
+        names = np.concatenate([df['homeTeamNickname'].to_numpy(), df['awayTeamNickname'].to_numpy()])
+        codes, teams = pd.factorize(names, sort=True)
+        rows = np.concatenate([np.arange(n)]*2)
+        present = codes >= 0
+        codes, rows = codes[present], rows[present]
+        # Group by team, and sort each team's rows by position
+        order = np.lexsort((rows, codes))
+        offsets = np.zeros(len(teams) + 1, dtype=np.int64)
+        offsets[1:] = np.cumsum(np.bincount(codes, minlength=len(teams)))
+        return cls([str(t) for t in teams], offsets, rows[order].astype(np.int32), n)
+
+    @classmethod
+    def concat(cls, parts):
+        """
+        Join the indexes of several data frames into the index
+        of the frames concatenated in the same order
+        """
+        teams = sorted(set(team for part in parts for team in part.teams))
+        starts = np.cumsum([0] + [part.nrows for part in parts])
+        arrays = []
+        offsets = np.zeros(len(teams) + 1, dtype=np.int64)
+        for i, team in enumerate(teams):
+            for start, part in zip(starts, parts):
+                arrays.append(part.team_positions(team) + np.int32(start))
+            offsets[i+1] = offsets[i] + sum(len(part.team_positions(team)) for part in parts)
+        positions = np.concatenate(arrays).astype(np.int32) if arrays else np.zeros(0, dtype=np.int32)
+        return cls(teams, offsets, positions, int(starts[-1]))
+
+    def team_positions(self, team):
+        """Get the sorted row positions of one team's games"""
+        i = self.slots.get(team)
+        if i is None:
+            return self.positions[:0]
+        return self.positions[self.offsets[i]:self.offsets[i+1]]
+
+    def covers(self, teams):
+        """True if teams includes every team in the index (so no row is filtered out)"""
+        return set(self.teams) <= set(teams)
+
+    def lookup(self, teams):
+        """
+        Get the sorted, unique row positions of the games
+        played by any of the teams (the union of their position arrays)
+        """
+        arrays = [self.team_positions(team) for team in set(teams)]
+        if len(arrays) == 0:
+            return self.positions[:0]
+        if len(arrays) == 1:
+            return np.asarray(arrays[0])
+        # Mark the rows instead of sorting the concatenated arrays
+        # (a game between two of the teams appears in both)
+        rows = np.zeros(self.nrows, dtype=bool)
+        for positions in arrays:
+            rows[positions] = True
+        return np.flatnonzero(rows)
@@ -1,6 +1,8 @@
 import json
 import os
-import blaseball_core_game_data as gd
+import functools
+from .datasource import get_teams_data
+from .reasons import BUILTIN_REASONS
 
 
 root_path = os.path.abspath(os.path.join(os.path.dirname(__file__)))
@@ -14,6 +16,97 @@ DALE_UTF8 = "Dal\u00e9"
 FULL_DALE_SAFE = "Miami Dale"
 FULL_DALE_UTF8 = "Miami Dal\u00e9"
 
+# Choices for command line flags, kept here (and not next to the
+# views) so that parsing command line flags does not need to import
+# pandas or rich
+NAMESTYLE_CHOICES = ['long', 'short', 'emoji']
+
+# Backends for GameData (pandas data frames, or NumPy arrays)
+ENGINE_CHOICES = ['pandas', 'numpy']
+
+# Default size cap of the on-disk result cache, in megabytes
+RESULT_CACHE_SIZE = 32
+
+# Built-in reasons (more can be defined with --reasons-file)
+REASON_CHOICES = [r.name for r in BUILTIN_REASONS] + ['all']
+
+
+class TeamIndex(object):
+    """
+    Index of the league, division, and team data for every season,
+    parsed once from the teams data. Lookups are dictionary lookups.
+    """
+    def __init__(self, teams_data):
+        # Per-season maps (0-indexed season):
+        # [{'leagues': {league: [teams]}, 'divisions': {division: [teams]}}]
+        self.seasons = []
+
+        # Maps for lookups with no season specified
+        # (first season in which a league/division appears)
+        self._league2teams = {}
+        self._division2teams = {}
+
+        leagues = set()
+        divisions = set()
+        teams = set()
+        for td in teams_data:
+            season_leagues = {k: sorted(v) for k, v in td['leagues'].items()}
+            season_divisions = {k: sorted(v) for k, v in td['divisions'].items()}
+            self.seasons.append({'leagues': season_leagues, 'divisions': season_divisions})
+
+            for league_, teams_ in season_leagues.items():
+                self._league2teams.setdefault(league_, teams_)
+                teams.update(teams_)
+            for division_, teams_ in season_divisions.items():
+                self._division2teams.setdefault(division_, teams_)
+
+            leagues.update(season_leagues.keys())
+            divisions.update(season_divisions.keys())
+
+        self.leagues = sorted(list(leagues))
+        self.divisions = sorted(list(divisions))
+        self.teams = sorted(list(teams))
+        self.teams_set = frozenset(self.teams)
+
+    def league_teams(self, league, season=None):
+        """
+        For a given league, return a list of all teams in that league,
+        optionally for a specific (0-indexed) season.
+        """
+        if season is None:
+            teams = self._league2teams.get(league, [])
+        else:
+            teams = self.seasons[season]['leagues'].get(league, [])
+        if len(teams)==0:
+            raise Exception("Error: Could not find any teams in league %s"%(league))
+        return list(teams)
+
+    def division_teams(self, division, season=None):
+        """
+        For a given division, return a list of all teams in that division,
+        optionally for a specific (0-indexed) season.
+        """
+        if season is None:
+            teams = self._division2teams.get(division, [])
+        else:
+            teams = self.seasons[season]['divisions'].get(division, [])
+        if len(teams)==0:
+            raise Exception("Error: Could not find any teams in division %s"%(division))
+        return list(teams)
+
+    def is_all_teams(self, teams):
+        """Return True if the list of teams covers every team"""
+        return self.teams_set.issubset(teams)
+
+
+@functools.lru_cache(maxsize=None)
+def get_team_index():
+    """
+    Get the TeamIndex for the teams data.
+    The teams data is parsed once per process.
+    """
+    return TeamIndex(json.loads(get_teams_data()))
+
 
 def get_league_division_team_data():
     """
@@ -21,72 +114,18 @@ def get_league_division_team_data():
     for creating command line flag options - includes old leagues
     and divisions.
     """
-    tds = json.loads(gd.get_teams_data())
-
-    leagues = set()
-    divisions = set()
-    teams = set()
-    for i in range(len(tds)):
-        td = tds[i]
-        leagues_ = sorted(list(td['leagues'].keys()))
-        divisions_ = sorted(list(td['divisions'].keys()))
-        leagues = leagues.union(leagues_)
-        divisions = divisions.union(leagues_)
+    ti = get_team_index()
+    return (ti.leagues, ti.divisions, ti.teams)
 
-        teams_ = []
-        for league_ in leagues_:
-            teams_ += td['leagues'][league_]
-        teams = teams.union(teams_)
 
-    leagues = sorted(list(leagues))
-    teams = sorted(list(teams))
-    divisions = sorted(list(divisions))
-
-    return (leagues, divisions, teams)
-
-
-def league_to_teams(league):
+def league_to_teams(league, season=None):
     """For a given league, return a list of all teams in that league."""
-    tds = json.loads(gd.get_teams_data())
-    teams = []
-    if season is None:
-        for i in range(len(tds)):
-            td = tds[i]
-            leagues = sorted(list(td['leagues'].keys()))
-            if league in leagues:
-                teams = sorted(list(td['leagues'][league]))
-                break
-    else:
-        td = tds[season]
-        leagues = sorted(list(td['leagues'].keys()))
-        if league in leagues:
-            teams = sorted(list(td['leagues'][league]))
-
-    if len(teams)==0:
-        raise Exception("Error: Could not find any teams in league %s"%(league))
-    return teams
-
-
-def division_to_teams(division):
-    """For a given division, return a list of all teams in that league."""
-    tds = json.loads(gd.get_teams_data())
-    teams = []
-    if season is None:
-        for i in range(len(tds)):
-            td = tds[i]
-            divisions = sorted(list(td['divisions'].keys()))
-            if division in divisions:
-                teams = sorted(list(td['divisions'][division]))
-                break
-    else:
-        td = tds[season]
-        divisions = sorted(list(td['divisions'].keys()))
-        if division in divisions:
-            teams = sorted(list(td['divisions'][division]))
+    return get_team_index().league_teams(league, season)
 
-    if len(teams)==0:
-        raise Exception("Error: Could not find any teams in division %s"%(division))
-    return teams
+
+def division_to_teams(division, season=None):
+    """For a given division, return a list of all teams in that division."""
+    return get_team_index().division_teams(division, season)
 
 
 def get_short2long():
@@ -109,3 +148,11 @@ def sanitize_dale(s):
     else:
         return s
 
+
+
+def ranked_rows(options):
+    """
+    Get the number of top-ranked rows each table needs:
+    the rows skipped with --offset, then the rows shown
+    """
+    return getattr(options, 'offset', 0) + options.n_results
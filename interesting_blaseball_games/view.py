@@ -1,16 +1,36 @@
-import time
 import sys
-import os
+import functools
+import numpy as np
 from rich.console import Console
 from rich.table import Table
-from .game_data import GameData, REASON2FUNCTION
+from .reasons import get_reasons
+from .explain import NO_EXPLAIN
+from .output import atomic_output, check_output_file
 from .util import (
     sanitize_dale,
-    get_league_division_team_data
+    get_team_index,
+    NAMESTYLE_CHOICES
 )
 
 
-NAMESTYLE_CHOICES = ['long', 'short', 'emoji']
+def decode_emoji(values):
+    """
+    Decode an array of hex code point strings (e.g. "0x1F31E") into emoji.
+    Each distinct value is decoded once and the result is broadcast back.
+    """
+    uniques, inverse = np.unique(np.asarray(values).astype(str), return_inverse=True)
+    lookup = np.array([_decode_emoji(u) for u in uniques], dtype=object)
+    return lookup[inverse.reshape(-1)]
+
+
+def str_concat(*parts):
+    """Concatenate arrays (or scalars) of strings element-wise"""
+    return functools.reduce(np.char.add, parts)
+
+
+@functools.lru_cache(maxsize=None)
+def _decode_emoji(x):
+    return chr(int(x, 16))
 
 
 class View(object):
@@ -18,56 +38,72 @@ class View(object):
     Base class for view classes, so that they all have
     the same options variables available.
     """
-    def __init__(self, options):
+    def __init__(self, options, game_data=None, explain=NO_EXPLAIN, result_cache=None):
         self.nresults = options.n_results
-        self.game_data = GameData(options)
+        self.offset = getattr(options, 'offset', 0)
+        self.explain = explain
         self.column_headers, self.nice_column_headers = self.assemble_column_headers(options)
+        if game_data is None:
+            if result_cache is None:
+                game_data = self.load_game_data(options, explain)
+            else:
+                # Only load the game data if the query's tables are not cached
+                from .result_cache import CachedResults
+                game_data = CachedResults(options, result_cache, self.column_headers,
+                                          lambda: self.load_game_data(options, explain), explain)
+        self.game_data = game_data
         self.name_style = options.name_style
 
         # For table description
         self.options = options
+        self.reasons = get_reasons(options.reasons_file)
 
-        # If an output file is specified, check if it exists and if the path to it exists
+        # If an output file is specified, check that it can be written
+        # (it is only replaced once every table has been rendered)
+        self.if_exists = getattr(options, 'if_exists', 'overwrite')
         if options.output == '':
             self.output_file = None
         else:
             self.output_file = options.output
-            if os.path.exists(self.output_file):
-                print("WARNING: Overwriting an existing file %s"%(self.output_file))
-                print("Waiting 5 seconds before proceeding")
-                time.sleep(5)
-                # Clear out the file
-                with open(self.output_file, 'w') as f:
-                    f.write("")
-            else:
-                output_file_path = os.path.abspath(os.path.dirname(self.output_file))
-                if not os.path.exists(output_file_path):
-                    raise Exception("Error: directory for output file (%s) does not exist!"%(output_file_path))
+            check_output_file(self.output_file, self.if_exists)
+
+    def load_game_data(self, options, explain=NO_EXPLAIN):
+        """Load the game data, with only the columns this view needs"""
+        if getattr(options, 'engine', 'pandas') == 'numpy':
+            from .array_engine import ArrayGameData
+            return ArrayGameData(options, explain=explain, columns=self.column_headers)
+        from .game_data import GameData
+        return GameData(options, explain=explain, columns=self.column_headers)
+
+    def shown_range(self, df):
+        """
+        Get the positions (start, stop) of the rows of a table
+        to show: n rows, after skipping the first offset rows
+        """
+        start = min(len(df), self.offset)
+        return (start, min(len(df), self.offset + self.nresults))
+
+    def shown_rows(self, df):
+        """Get the number of rows of a table to show"""
+        start, stop = self.shown_range(df)
+        return stop - start
 
     def make_table(self):
         """Virtual method to make table(s)"""
         raise NotImplementedError("View class is a base class, do not call it directly")
 
+    # Strings marking (regular season, postseason) games
+    postseason_markers = ('', '*')
+
     def table_description(self, reason):
         """
         Create table descriptions for each table, customizing
         based on filters the user provides
         """
         options = self.options
-        if reason == 'blowout':
-            desc = "Blowout games (games with high scores and high run differentials) "
-        elif reason == 'shutout':
-            desc = "Shutout games (games where the loser had zero runs) "
-        elif reason == 'shame':
-            desc = "Shame games (games where the loser was shamed) "
-        elif reason == 'underdog':
-            desc = "Underdog games (games where the underdog won with large run differential) "
-        elif reason == 'maxedout':
-            desc = "Maxed out games (high-scoring one-run games) "
-        elif reason == 'defensive':
-            desc = "Defensive games (low-scoring one-run games) "
-        else:
-            raise Exception("Error: reason not recognized. Valid reasons: %s"%(", ".join(list(REASON2FUNCTION.keys()))))
+        if reason not in self.reasons:
+            raise Exception("Error: reason not recognized. Valid reasons: %s"%(", ".join(list(self.reasons.keys()) + ['all'])))
+        desc = self.reasons[reason].description + " "
 
         if 'all' in options.season:
             desc += "for all time "
@@ -80,10 +116,9 @@ class View(object):
         if options.postseason :
             desc += "(postseason only) "
 
-        _, _, ALLTEAMS = get_league_division_team_data()
         if len(options.team)==1:
             desc += "for team %s"%("".join(options.team))
-        elif len(set(ALLTEAMS) - set(options.team)) == 0:
+        elif get_team_index().is_all_teams(options.team):
             desc += "for all teams"
         else:
             desc += "for teams %s"%(", ".join(options.team))
@@ -198,94 +233,165 @@ class View(object):
 
         return (column_names, nice_column_names)
 
+    def table_data(self):
+        """
+        Format every table as plain data (for JSON output).
+        Returns: list of dicts with the reason, table description,
+        column names, and rows (lists of strings)
+        """
+        result = []
+        for reason, df in self.game_data.parse():
+            formatted = self.format_table(df, reason)
+            result.append({
+                'reason': reason,
+                'description': self.table_description(reason),
+                'columns': [nice_column_header for _, nice_column_header, _ in formatted],
+                'rows': [list(row) for row in zip(*[values.tolist() for _, _, values in formatted])],
+            })
+        return result
+
+    def format_table(self, df, reason, start=None, stop=None):
+        """
+        Format the rows of a table of games to show (or the rows
+        from start to stop) for display. Every column is formatted
+        in one whole-column operation (no per-cell Python calls),
+        and the odds columns are dropped.
+
+        Returns: list of tuples (column name, nice column name, array of strings)
+        """
+        if start is None:
+            start, stop = self.shown_range(df)
+        # Cut data to table data only
+        cut = df[self.column_headers][start:stop]
+        columns = {c: np.asarray(cut[c]) for c in self.column_headers}
+
+        # Bump season and game numbers by one (zero-indexed in dataframe)
+        for column_header in ['season', 'day']:
+            columns[column_header] = columns[column_header] + 1
+
+        # Format any column ending in "Emoji" as emoji
+        for column_header in self.column_headers:
+            if column_header[-5:]=='Emoji':
+                columns[column_header] = decode_emoji(columns[column_header])
+
+        # Replace Team with Team (X%)
+        if reason=='underdog':
+            # Eventually we may want to do this with ALL reasons
+            for column_header in self.column_headers:
+                if column_header[-4:]=='Odds':
+                    prefix = column_header[:-4]
+                    namelabel = [j for j in self.column_headers if j.startswith(prefix + 'Team')][0]
+                    pct = np.rint(100*columns[column_header].astype(float)).astype(int).astype(str)
+                    columns[namelabel] = str_concat(columns[namelabel].astype(str), " (", pct, "%)")
+
+        # Format the isPostseason column for printing
+        no, yes = self.postseason_markers
+        columns['isPostseason'] = np.where(columns['isPostseason'].astype(bool), yes, no)
+
+        # Make everything a string, and remove the odds columns
+        formatted = []
+        for column_header, nice_column_header in zip(self.column_headers, self.nice_column_headers):
+            if 'Odds' in column_header:
+                continue
+            formatted.append((column_header, nice_column_header, columns[column_header].astype(str)))
+        return formatted
+
 
 class RichView(View):
     """
     Create a table and render it using rich
     """
+    postseason_markers = (' ', 'Y')
+
     def make_table(self):
         """
-        Get a list of DataFrames and descriptions, 
-        and render them as tables with rich.
+        Get DataFrames and descriptions, and render them as tables
+        with rich, each one as soon as it has been computed.
         """
         # Get dataframes and descriptions
         tables = self.game_data.parse()
         for table in tables:
             reason, df = table
             desc = self.table_description(reason)
-            self._render_table(desc, df, reason)
+            with self.explain.stage("render: %s"%(reason)) as record:
+                done = self._render_table(desc, df, reason)
+                record['rows'] = self.shown_rows(df)
+            if not done:
+                break
 
-    def _render_table(self, description, df, reason):
+    def page_size(self, console):
         """
-        Render a table using rich
+        Get the number of rows to render at a time: --page-size, or
+        with --pager, as many rows as fit on the screen (None: all rows)
         """
-        # Cut data to table data only
-        cut = df[self.column_headers][:min(len(df), self.nresults)].copy()
-
-        # Bump season and game numbers by one (zero-indexed in dataframe)
-        # (Pandas is soooo intuitive)
-        plusone = lambda x : x + 1
-        new_season_column = cut['season'].apply(plusone)
-        new_game_column = cut['day'].apply(plusone)
-        cut = cut.assign(**{'season': new_season_column, 'day': new_game_column})
-
-        # Create name and odds labels
-        if self.options.win_loss:
-            pre = ['winning','losing']
-        else:
-            pre = ['home','away']
+        if self.options.page_size:
+            return self.options.page_size
+        if self.options.pager:
+            # Leave room for the table borders, header, and prompt
+            return max(console.size.height - 6, 1)
+        return None
 
-        if self.options.name_style=='short':
-            namelabels = [j + 'TeamNickname' for j in pre]
-        elif self.options.name_style=='long':
-            namelabels = [j + 'TeamName' for j in pre]
-        elif self.options.name_style=='emoji':
-            namelabels = [j + 'TeamEmoji' for j in pre]
+    def _render_table(self, description, df, reason):
+        """
+        Render a table using rich. With a page size, the rows are
+        formatted and printed one page at a time, so the first rows
+        show up at once and only one page is held in memory.
+        Returns: False if the user quit the pager, otherwise True
+        """
+        console = Console()
 
-        oddslabels = [j + 'Odds' for j in pre]
+        console.print("\n\n")
 
-        # Replace Team with Team (X%)
-        if reason=='underdog':
-            # Eventually we may want to do this with ALL reasons
-            for namelabel, oddslabel in zip(namelabels, oddslabels):
-                addodds = lambda row: "%s (%d%%)"%(row[namelabel], round(100*row[oddslabel]))
-                try:
-                    cut[namelabel] = cut[[namelabel, oddslabel]].apply(addodds, axis=1)
-                except KeyError:
-                    print(cut.columns)
-                    print(cut)
-                    sys.exit(1)
-
-        # Remove the odds columns
-        cut.drop(oddslabels, axis=1, inplace=True)
-
-        # Remove the odds headers
-        self.column_headers = [j for j in self.column_headers if 'Odds' not in j]
-        self.nice_column_headers = [j for j in self.nice_column_headers if 'Odds' not in j]
-
-        # Format the isPostseason column for printing (empty space if not, else Y)
-        postseason_lambda = lambda c: ' ' if c is False else 'Y'
-        new_postseason_column = cut['isPostseason'].apply(postseason_lambda)
-        cut = cut.assign(**{'isPostseason': new_postseason_column.values})
-
-        # Format any column ending in "Emoji" as emoji (hope this works!)
-        # (there must be a more efficient way to do this, but I really, really hate pandas now.)
-        for column_header in self.column_headers:
-            emoji_lambda = lambda x: chr(int(x, 16))
-            if column_header[-5:]=='Emoji':
-                new_column = cut[column_header].apply(emoji_lambda)
-                cut = cut.assign(**{column_header: new_column})
+        start, stop = self.shown_range(df)
+        size = self.page_size(console)
+        if size is None or stop - start <= size:
+            pages = [(start, stop)]
+        else:
+            pages = [(i, min(i + size, stop)) for i in range(start, stop, size)]
 
-        # Make everything in the dataframe a string
-        cut = cut.applymap(str)
-
-        console = Console()
+        for i, (page_start, page_stop) in enumerate(pages):
+            if i > 0 and not self._next_page(console, page_start, start, stop):
+                return False
+            console.print(self._rich_table(self.format_table(df, reason, page_start, page_stop)))
 
+        console.print("\n")
+        print(description)
         console.print("\n\n")
+        return True
 
+    def renderables(self):
+        """
+        Get the tables and their descriptions as rich renderables
+        (for redrawing them in place, see watch.py)
+        """
+        from rich.text import Text
+        for reason, df in self.game_data.parse():
+            yield Text("")
+            yield self._rich_table(self.format_table(df, reason))
+            yield Text(self.table_description(reason))
+
+    def _next_page(self, console, page_start, start, stop):
+        """
+        With --pager (in a terminal), wait for the user before the
+        next page. Returns: False if the user quit, otherwise True
+        """
+        if not self.options.pager or not console.is_terminal or not sys.stdin.isatty():
+            return True
+        prompt = "[dim]-- rows %d-%d of %d shown: Enter for more, q to quit --[/dim] "%(
+            start + 1, page_start, stop)
+        try:
+            answer = console.input(prompt)
+        except (EOFError, KeyboardInterrupt):
+            return False
+        return answer.strip().lower() not in ('q', 'quit')
+
+    def _rich_table(self, formatted):
+        """
+        Make a rich table from formatted columns
+        """
         table = Table(show_header=True, header_style="bold")
 
-        for column_header, nice_column_header in zip(self.column_headers, self.nice_column_headers):
+        for column_header, nice_column_header, _ in formatted:
             if column_header=="losingScore" or column_header=="awayScore":
                 # Justify losing/away scores to the right (opposite winning/home scores)
                 table.add_column(nice_column_header, justify="right")
@@ -295,105 +401,79 @@ class RichView(View):
             else:
                 table.add_column(nice_column_header)
 
-        for i, row in cut.iterrows():
-            table.add_row(*row.values)
-
-        console.print(table)
-        console.print("\n")
-        print(description)
-        console.print("\n\n")
+        for row in zip(*[values for _, _, values in formatted]):
+            table.add_row(*row)
+        return table
 
 
 class MarkdownView(View):
     """
     Create a table and render it as a Markdown table
     """
-    # TODO: integrate some of the shared rich/markdown view functionality
     def make_table(self):
         """
-        Get list of DataFrames and descriptions,
-        and render each one as Markdown table
+        Get DataFrames and descriptions, and render each one
+        as a Markdown table as soon as it has been computed
         """
         tables = self.game_data.parse()
+        if self.output_file is None:
+            self._render_tables(tables)
+        else:
+            # All tables go through one buffered writer, and the
+            # output file is replaced only once they are all written
+            with atomic_output(self.output_file, self.if_exists) as f:
+                self._render_tables(tables, f)
+
+    def _render_tables(self, tables, f=None):
         for table in tables:
             reason, df = table
             desc = self.table_description(reason)
             desc += " (asterisk indicates a postseason game)"
-            self._render_table(desc, df, reason)
+            with self.explain.stage("render: %s"%(reason)) as record:
+                self._render_table(desc, df, reason, f)
+                record['rows'] = self.shown_rows(df)
 
-    def _render_table(self, description, df, reason):
+    def to_markdown(self):
         """
-        Render a table as a Markdown table
+        Render every table into one Markdown string
+        (the same text that is written to an output file)
         """
-        # Cut data to table data only
-        cut = df[self.column_headers][:min(len(df), self.nresults)].copy()
+        chunks = []
+        for reason, df in self.game_data.parse():
+            desc = self.table_description(reason)
+            desc += " (asterisk indicates a postseason game)"
+            chunks.append("\n\n" + desc + "\n" + self._markdown_table(df, reason))
+        return "".join(chunks)
 
-        # Bump season and game numbers by one (zero-indexed in dataframe)
-        # (Pandas is soooo intuitive)
-        plusone = lambda x : x + 1
-        new_season_column = cut['season'].apply(plusone)
-        new_game_column = cut['day'].apply(plusone)
-        cut = cut.assign(**{'season': new_season_column, 'day': new_game_column})
-
-        # Create name and odds labels
-        if self.options.win_loss:
-            pre = ['winning','losing']
+    def _render_table(self, description, df, reason, f=None):
+        """
+        Render a table as a Markdown table,
+        printed or written to the open output file f
+        """
+        table = self._markdown_table(df, reason)
+        if f is None:
+            print("\n\n")
+            print(description)
+            print("\n")
+            print(table)
+            # Show each table right away, even when stdout is a pipe
+            sys.stdout.flush()
         else:
-            pre = ['home','away']
-
-        if self.options.name_style=='short':
-            namelabels = [j + 'TeamNickname' for j in pre]
-        elif self.options.name_style=='long':
-            namelabels = [j + 'TeamName' for j in pre]
-        elif self.options.name_style=='emoji':
-            namelabels = [j + 'TeamEmoji' for j in pre]
-
-        oddslabels = [j + 'Odds' for j in pre]
-
-        # Replace Team with Team (X%)
-        if reason=='underdog':
-            # Eventually we may want to do this with ALL reasons
-            for namelabel, oddslabel in zip(namelabels, oddslabels):
-                addodds = lambda row: "%s (%d%%)"%(row[namelabel], round(100*row[oddslabel]))
-                try:
-                    cut[namelabel] = cut[[namelabel, oddslabel]].apply(addodds, axis=1)
-                except KeyError:
-                    print(cut.columns)
-                    print(cut)
-                    sys.exit(1)
-
-
-        # Remove the odds columns
-        cut.drop(oddslabels, axis=1, inplace=True)
-
-        # Remove the odds headers
-        self.column_headers = [j for j in self.column_headers if 'Odds' not in j]
-        self.nice_column_headers = [j for j in self.nice_column_headers if 'Odds' not in j]
-
-        # Format the isPostseason column for printing (empty space if not, else Y)
-        postseason_lambda = lambda c: '' if c is False else '*'
-        new_postseason_column = cut['isPostseason'].apply(postseason_lambda)
-        cut = cut.assign(**{'isPostseason': new_postseason_column.values})
-
-        # Format any column ending in "Emoji" as emoji (hope this works!)
-        # (there must be a more efficient way to do this, but I really, really hate pandas now.)
-        for column_header in self.column_headers:
-            emoji_lambda = lambda x: chr(int(x, 16))
-            if column_header[-5:]=='Emoji':
-                new_column = cut[column_header].apply(emoji_lambda)
-                cut = cut.assign(**{column_header: new_column})
-
-        # Make everything in the dataframe a string
-        cut = cut.applymap(str)
+            f.write("\n\n" + description + "\n" + table)
 
-        # This string is the final table in Markdown format
-        table = ""
+    def _markdown_table(self, df, reason):
+        """
+        Format a table of games as a Markdown table string
+        """
+        formatted = self.format_table(df, reason)
+        columns = dict((column_header, values) for column_header, _, values in formatted)
 
         # Start header line
         table_header = "| "
         # Start separator line (controls alignment)
         table_sep = "| "
-        for column_header, nice_column_header in zip(self.column_headers, self.nice_column_headers):
+        row_columns = []
+        for column_header, nice_column_header, values in formatted:
             if column_header == 'isPostseason':
                 continue
             table_header += "%s | "%(nice_column_header)
@@ -406,35 +486,15 @@ class MarkdownView(View):
             else:
                 table_sep += "------ |"
 
-        table += table_header
-        table += "\n"
-        table += table_sep
-        table += "\n"
-
-        for i, row in cut.iterrows():
-            table_row = "| "
-            for k, val in zip(row.keys(), row.values):
-                if k == 'isPostseason':
-                    continue
-                elif k == 'day':
-                    table_row += "%s%s | "%(str(val), row['isPostseason'])
-                else:
-                    table_row += "%s | "%(str(val))
-            table += table_row
-            table += "\n"
-
-        # TODO
-        # Something something, DRY
-        # Something something, more pythonic
-        if self.output_file is None:
-            print("\n\n")
-            print(description)
-            print("\n")
-            print(table)
-        else:
-            with open(self.output_file, 'a') as f:
-                f.write("\n\n")
-                f.write(description)
-                f.write("\n")
-                f.write(table)
+            if column_header == 'day':
+                # Mark postseason games next to the day
+                values = str_concat(values, columns['isPostseason'])
+            row_columns.append(values)
+
+        # Build each row with one join instead of repeated string concatenation
+        lines = [table_header, table_sep]
+        for row in zip(*row_columns):
+            lines.append("| " + "".join("%s | "%(val) for val in row))
 
+        # This string is the final table in Markdown format
+        return "\n".join(lines) + "\n"
@@ -0,0 +1,195 @@
+import os
+import json
+import time
+from .command import get_parser, check_modes, process_options, QueryParser
+from .datasource import read_data_manifest, get_data_dir, get_games_data
+from .explain import NO_EXPLAIN
+from .game_data import GameData, build_games_frame, load_games_frame
+from .live import LiveGameData
+from .loader import iter_games
+from .team_rows import TeamRows
+from .util import get_team_index
+
+
+def file_signature(path):
+    """Get the (mtime, size) of a file, or None if it does not exist"""
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return (st.st_mtime_ns, st.st_size)
+
+
+def data_signature():
+    """
+    Get the content hashes of the refreshed data files (see refresh.py),
+    or None if nothing has been refreshed
+    """
+    manifest = read_data_manifest()
+    if manifest is None:
+        return None
+    return dict((name, entry.get('sha256')) for name, entry in manifest['files'].items())
+
+
+def game_record(game):
+    """Add the score columns (see _add_columns) to a game record from the games JSON"""
+    game = dict(game)
+    game['winningLosingScore'] = "%d - %d"%(game['winningScore'], game['losingScore'])
+    game['homeAwayScore'] = "%d - %d"%(game['homeScore'], game['awayScore'])
+    return game
+
+
+def appended_games(games_json, known_ids):
+    """
+    Find the games added to the end of the games JSON since the games
+    with known_ids were loaded (tie games are skipped, as they are
+    never loaded). Returns: list of new game records, or None if games
+    were removed or inserted before known games, so the data has to be
+    loaded again from scratch
+    """
+    new_games = []
+    found = 0
+    for game in iter_games(games_json):
+        if game['homeScore'] == game['awayScore']:
+            continue
+        if game['id'] in known_ids:
+            if new_games:
+                return None
+            found += 1
+        else:
+            new_games.append(game)
+    if found != len(known_ids):
+        return None
+    return new_games
+
+
+class Watcher(object):
+    """
+    Keeps the game data and the tables in memory, and updates them when
+    the config file or the (refreshed) game data changes:
+
+    * new games at the end of the game data are offered to the tables
+      of the reasons they qualify for (see LiveGameData), without
+      ranking the other games again
+    * any other change to the data (or a change to the teams) loads
+      the data again
+    * a change to the config file parses the options again and ranks
+      the games in memory with the new options
+    """
+    def __init__(self, options, sysargs, explain=NO_EXPLAIN):
+        self.options = options
+        self.sysargs = sysargs
+        self.config = options.config or None
+        self.config_signature = file_signature(self.config) if self.config else None
+        self.data_signature = data_signature()
+        self.status = ""
+        self.load(explain)
+        self.rank(explain)
+
+    def load(self, explain=NO_EXPLAIN):
+        """Load the (unfiltered) games data frame and its team index"""
+        self.games, self.team_rows = load_games_frame(self.options.cache_dir, not self.options.no_cache,
+                                                      explain, with_team_rows=True)
+        self.known_ids = set(self.games['id'])
+        # Games added since the data frame was loaded
+        self.added = []
+
+    def rank(self, explain=NO_EXPLAIN):
+        """Rank the games in memory with the current options"""
+        from .view import RichView
+        if self.added:
+            # Fold the added games into the data frame first
+            import pandas as pd
+            added = build_games_frame(json.dumps(self.added), explain)
+            self.games = pd.concat([self.games, added.reindex(columns=self.games.columns)], ignore_index=True)
+            self.team_rows = TeamRows.from_frame(self.games)
+            self.added = []
+        game_data = GameData(self.options, self.games, explain, team_rows=self.team_rows)
+        self.view = RichView(self.options, game_data, explain)
+        self.live_data = LiveGameData(self.options, game_data)
+        self.view.game_data = self.live_data
+
+    def poll(self):
+        """
+        Check the config file and the game data for changes,
+        and update the tables. Returns: True if the tables changed
+        """
+        if self.config:
+            signature = file_signature(self.config)
+            if signature != self.config_signature:
+                self.config_signature = signature
+                return self.reload_config()
+        signature = data_signature()
+        if signature != self.data_signature:
+            previous, self.data_signature = self.data_signature, signature
+            return self.reload_data(previous)
+        return False
+
+    def reload_config(self):
+        """Parse the options again (keeping the old ones if they are not valid)"""
+        try:
+            options = get_parser(QueryParser).parse_args(self.sysargs)
+            check_modes(options)
+            options = process_options(options)
+        except Exception as e:
+            self.set_status("config file %s not loaded: %s"%(self.config, e))
+            return True
+        self.options = options
+        self.rank()
+        self.set_status("reloaded config file %s"%(self.config))
+        return True
+
+    def reload_data(self, previous):
+        """Add the new games, or load the data again if more than that changed"""
+        teams_changed = (previous or {}).get('teams') != (self.data_signature or {}).get('teams')
+        new_games = None if teams_changed else appended_games(get_games_data(), self.known_ids)
+        if new_games is None:
+            # Team names (and the parser's choices) may have changed too
+            get_team_index.cache_clear()
+            self.load()
+            self.rank()
+            self.set_status("reloaded game data (%d games)"%(len(self.games)))
+            return True
+        changed = False
+        for game in new_games:
+            record = game_record(game)
+            self.known_ids.add(game['id'])
+            self.added.append(game)
+            changed = self.live_data.add_game(record) or changed
+        self.set_status("%d new games, %s"%(len(new_games), "tables updated" if changed else "no table changed"))
+        return True
+
+    def set_status(self, message):
+        self.status = "%s: %s"%(time.strftime("%H:%M:%S"), message)
+
+    def renderable(self):
+        """Get the tables and a status line, for rich Live"""
+        from rich.console import Group
+        from rich.text import Text
+        watched = [get_data_dir()] + ([self.config] if self.config else [])
+        status = "Watching %s (every %g s, Ctrl-C to stop)"%(" and ".join(watched), self.options.watch_interval)
+        if self.status:
+            status += " -- last change %s"%(self.status)
+        return Group(*(list(self.view.renderables()) + [Text(status, style="dim")]))
+
+
+def run_watch(options, sysargs, explain=NO_EXPLAIN):
+    """
+    Render the tables, then redraw them in place whenever
+    the config file or the game data changes
+    """
+    from rich.live import Live
+    watcher = Watcher(options, sysargs, explain)
+    with Live(watcher.renderable(), auto_refresh=False) as live:
+        try:
+            while True:
+                time.sleep(watcher.options.watch_interval)
+                try:
+                    changed = watcher.poll()
+                except Exception as e:
+                    watcher.set_status("update failed: %s"%(e))
+                    changed = True
+                if changed:
+                    live.update(watcher.renderable(), refresh=True)
+        except KeyboardInterrupt:
+            pass
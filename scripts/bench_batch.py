@@ -0,0 +1,102 @@
+#!/usr/bin/env python
+"""
+Compare the throughput of batch mode (--batch, which loads the game data
+once and shares it between worker processes) with running the command
+line tool once per query.
+
+Generates a file of query specs (combinations of team, season and reason),
+runs them both ways in a temporary directory, checks that both ways write
+the same output, and reports queries per second.
+
+Usage:
+    bench_batch.py --queries 40
+    bench_batch.py --queries 100 --workers 4
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+import itertools
+import subprocess
+from interesting_blaseball_games.util import get_team_index
+
+
+RUNNER = "import sys; from interesting_blaseball_games.command import main; main(sys.argv[1:])"
+
+REASONS = ['blowout', 'shutout', 'shame', 'underdog', 'maxedout', 'defensive', 'all']
+
+
+def make_specs(nqueries):
+    """Make nqueries query specs, cycling through teams, seasons and reasons"""
+    team_index = get_team_index()
+    # Seasons are 1-indexed on the command line
+    seasons = [str(s+1) for s in range(len(team_index.seasons))] + [None]
+    combos = itertools.cycle(itertools.product(team_index.teams, seasons, REASONS))
+    specs = []
+    for i, (team, season, reason) in zip(range(nqueries), combos):
+        spec = {'name': 'query-%d'%(i+1), 'team': team, 'reason': reason}
+        if season is not None:
+            spec['season'] = season
+        specs.append(spec)
+    return specs
+
+
+def spec_to_cli(spec, output):
+    """Command line arguments that run one query spec on its own"""
+    args = ['--markdown', '--output', output, '--reason', spec['reason'], '--team', spec['team']]
+    if 'season' in spec:
+        args += ['--season', spec['season']]
+    return args
+
+
+def main():
+    p = argparse.ArgumentParser()
+    p.add_argument('--queries', type=int, default=40, help='number of queries to run')
+    p.add_argument('--workers', type=int, default=None, help='number of batch worker processes (default: number of CPUs)')
+    args = p.parse_args()
+
+    specs = make_specs(args.queries)
+    with tempfile.TemporaryDirectory() as tmp:
+        batch_dir = os.path.join(tmp, 'batch')
+        single_dir = os.path.join(tmp, 'single')
+        os.makedirs(batch_dir)
+        os.makedirs(single_dir)
+        spec_file = os.path.join(tmp, 'specs.json')
+        with open(spec_file, 'w') as f:
+            json.dump([dict(spec, output=os.path.join(batch_dir, spec['name'] + '.md')) for spec in specs], f)
+
+        # Warm the game data cache, so neither way pays for building it
+        subprocess.run([sys.executable, '-c', RUNNER, '--rebuild-cache'], stdout=subprocess.DEVNULL, check=True)
+
+        batch_args = ['--batch', spec_file]
+        if args.workers:
+            batch_args += ['--workers', str(args.workers)]
+        t0 = time.perf_counter()
+        subprocess.run([sys.executable, '-c', RUNNER] + batch_args, stderr=subprocess.DEVNULL, check=True)
+        batch_seconds = time.perf_counter() - t0
+
+        t0 = time.perf_counter()
+        for spec in specs:
+            output = os.path.join(single_dir, spec['name'] + '.md')
+            subprocess.run([sys.executable, '-c', RUNNER] + spec_to_cli(spec, output), stdout=subprocess.DEVNULL, check=True)
+        single_seconds = time.perf_counter() - t0
+
+        mismatched = []
+        for spec in specs:
+            with open(os.path.join(batch_dir, spec['name'] + '.md')) as f1, open(os.path.join(single_dir, spec['name'] + '.md')) as f2:
+                if f1.read() != f2.read():
+                    mismatched.append(spec['name'])
+
+    print("%-26s %10s %14s"%("mode", "time (s)", "queries/s"))
+    print("%-26s %10.2f %14.1f"%("batch (--batch)", batch_seconds, len(specs)/batch_seconds))
+    print("%-26s %10.2f %14.1f"%("one process per query", single_seconds, len(specs)/single_seconds))
+    print("speedup: %.1fx"%(single_seconds/batch_seconds))
+    if mismatched:
+        print("Outputs differ for: %s"%(", ".join(mismatched)))
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
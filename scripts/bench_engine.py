@@ -0,0 +1,174 @@
+#!/usr/bin/env python
+"""
+Check that the numpy engine (--engine numpy) produces the same tables
+as the pandas engine, and compare how long each takes to filter and
+rank the games, on synthetic game histories of several sizes. Also
+check that the incremental tables of --live and --watch (LiveGameData)
+match the pandas engine, including for custom reasons sorted on string
+columns and on columns with missing values.
+
+For every query, both engines start from the same games data frame
+(the numpy engine gets it as an ArrayTable), and the Markdown and JSON
+output of the two are compared. The script exits with a nonzero status
+if any output differs.
+
+Usage:
+    bench_engine.py
+    bench_engine.py --scale 1 --scale 10 --repeat 5
+"""
+import os
+import sys
+import time
+import json
+import argparse
+import tempfile
+import numpy as np
+from synthetic_games import generate_games_json
+from interesting_blaseball_games.command import get_parser, process_options
+from interesting_blaseball_games.game_data import GameData, build_games_frame
+from interesting_blaseball_games.array_engine import ArrayGameData, ArrayTable
+from interesting_blaseball_games.explain import NO_EXPLAIN
+from interesting_blaseball_games.reasons import select_reasons
+from interesting_blaseball_games.team_rows import TeamRows
+from interesting_blaseball_games.view import MarkdownView
+from interesting_blaseball_games.live import LiveGameData
+
+
+QUERIES = [
+    ("everything", []),
+    ("one team, one season", ['--team', 'Sunbeams', '--season', '2']),
+    ("league, postseason", ['--league', 'Good', '--postseason', '--losing-pitcher']),
+    ("division, home/away", ['--division', 'Lawful Evil', '--home-away', '--name-style', 'long']),
+    ("underdog, 50 rows", ['--reason', 'underdog', '-n', '50', '--winning-pitcher']),
+    ("shame, no rows", ['--reason', 'shame', '-n', '0']),
+]
+
+# Custom reasons for the live check, sorted on string columns
+LIVE_REASONS = """
+[byname]
+sort = winningTeamNickname desc, season, day
+description = Games by winning team name
+
+[bypitcher]
+predicate = runDiff >= 3
+sort = losingPitcherName, winningScore desc
+description = Games by losing pitcher
+"""
+
+LIVE_QUERIES = [
+    ("everything", []),
+    ("custom, string sort desc", ['--reason', 'byname', '-n', '25']),
+    ("custom, string sort asc", ['--reason', 'bypitcher', '-n', '25']),
+]
+
+
+def make_options(args):
+    """Parse command line arguments the same way the tool does"""
+    return process_options(get_parser().parse_args(args + ['--markdown']))
+
+
+def pandas_engine(options, games, team_rows):
+    """Filter and rank with GameData"""
+    gdata = GameData(options, games, team_rows=team_rows)
+    return gdata, list(gdata.parse())
+
+
+def numpy_engine(options, table, team_rows):
+    """Filter and rank with ArrayGameData, starting from the same (unfiltered) games"""
+    gdata = ArrayGameData.__new__(ArrayGameData)
+    gdata.options = options
+    gdata.reasons = select_reasons(options.reason, options.reasons_file)
+    gdata.explain = NO_EXPLAIN
+    gdata.team_rows = team_rows
+    gdata.df = table
+    gdata.df = gdata._team_filter(options.team)
+    if 'all' not in options.season:
+        # (the numpy engine only loads the requested seasons, so it has no season filter)
+        seasons = [int(s)-1 for s in options.season]
+        gdata.df = gdata.df.take(np.flatnonzero(np.isin(gdata.df['season'], seasons)))
+    gdata.df = gdata._postseason_filter(options.postseason)
+    return gdata, list(gdata.parse())
+
+
+class Tables(object):
+    """Stand-in for GameData holding tables already computed"""
+    def __init__(self, options, tables):
+        self.options = options
+        self.tables = tables
+
+    def parse(self):
+        return self.tables
+
+
+def live_engine(options, games):
+    """
+    Seed LiveGameData with the first half of the games,
+    then add the second half one game at a time
+    """
+    half = len(games)//2
+    live_data = LiveGameData(options, GameData(options, games.iloc[:half]))
+    for game in games.iloc[half:].to_dict('records'):
+        live_data.add_game(game)
+    return live_data.parse()
+
+
+def render(options, tables):
+    """Render tables the way --markdown (and the query server's JSON) would"""
+    view = MarkdownView(options, Tables(options, tables))
+    return view.to_markdown() + json.dumps(view.table_data())
+
+
+def best_time(func, repeat):
+    best = None
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        func()
+        elapsed = time.perf_counter() - t0
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def main():
+    p = argparse.ArgumentParser()
+    p.add_argument('--scale', type=float, action='append', help='history size as a multiple of the real history (repeat for several; default 1 and 10)')
+    p.add_argument('--repeat', type=int, default=3, help='number of runs per measurement (best is reported)')
+    args = p.parse_args()
+
+    mismatches = 0
+    print("%-6s %-24s %12s %12s %8s  %s"%("scale", "query", "pandas (s)", "numpy (s)", "speedup", "output"))
+    for scale in args.scale or [1, 10]:
+        games = build_games_frame(generate_games_json(scale))
+        table = ArrayTable.from_frame(games)
+        team_rows = TeamRows.from_frame(games)
+        for name, query in QUERIES:
+            options = make_options(query)
+            _, pandas_tables = pandas_engine(options, games, team_rows)
+            _, numpy_tables = numpy_engine(options, table, team_rows)
+            same = render(options, pandas_tables) == render(options, numpy_tables)
+            mismatches += 0 if same else 1
+            t_pandas = best_time(lambda: pandas_engine(options, games, team_rows), args.repeat)
+            t_numpy = best_time(lambda: numpy_engine(options, table, team_rows), args.repeat)
+            print("%-6s %-24s %12.4f %12.4f %7.1fx  %s"%(
+                "%gx"%(scale), name, t_pandas, t_numpy, t_pandas/max(t_numpy, 1e-9), "same" if same else "DIFFERENT"))
+
+    with tempfile.NamedTemporaryFile('w', suffix='.ini', delete=False) as f:
+        f.write(LIVE_REASONS)
+    try:
+        print("\n%-6s %-24s %s"%("scale", "live query", "output"))
+        for scale in args.scale or [1, 10]:
+            games = build_games_frame(generate_games_json(scale))
+            for name, query in LIVE_QUERIES:
+                options = make_options(query + ['--reasons-file', f.name])
+                same = render(options, list(GameData(options, games).parse())) == render(options, live_engine(options, games))
+                mismatches += 0 if same else 1
+                print("%-6s %-24s %s"%("%gx"%(scale), name, "same" if same else "DIFFERENT"))
+    finally:
+        os.unlink(f.name)
+
+    if mismatches:
+        print("\n%d queries gave different output"%(mismatches))
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
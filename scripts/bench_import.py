@@ -0,0 +1,91 @@
+#!/usr/bin/env python
+"""
+Guard the startup time of interesting-blaseball-games.
+
+Runs the command line tool with `python -X importtime` for the paths
+that should stay fast (--version, --help, and an argument error), and
+checks that none of them import pandas, numpy, or rich, and that the
+total import time stays within a budget. Exits with a nonzero status
+if any check fails, so it can run in CI.
+
+Usage:
+    bench_import.py
+    bench_import.py --budget-ms 150
+"""
+import sys
+import time
+import argparse
+import subprocess
+
+
+# Modules that must not be imported on the fast paths
+FORBIDDEN = ['pandas', 'numpy', 'rich']
+
+# Command line arguments for each fast path
+CASES = [
+    ("--version", ['--version']),
+    ("--help", ['--help']),
+    ("invalid argument", ['--name-style', 'nope']),
+    ("invalid season", ['--season', 'x']),
+]
+
+RUNNER = "import sys; from interesting_blaseball_games.command import main; main(sys.argv[1:])"
+
+
+def run_case(args):
+    """
+    Run the tool once with -X importtime.
+    Returns: tuple (wall time in seconds, dict of top-level module to cumulative import time in us)
+    """
+    t0 = time.perf_counter()
+    proc = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', RUNNER] + args,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.PIPE,
+        universal_newlines=True,
+    )
+    elapsed = time.perf_counter() - t0
+
+    imports = {}
+    for line in proc.stderr.splitlines():
+        # import time: self [us] | cumulative | imported package
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        if not name.startswith('  '):
+            # Only count top-level imports (nested ones are included in cumulative)
+            imports[name.strip()] = int(cumulative)
+        else:
+            imports.setdefault(name.strip(), 0)
+    return (elapsed, imports)
+
+
+def main():
+    p = argparse.ArgumentParser()
+    p.add_argument('--budget-ms', type=float, default=250.0, help='maximum total import time for each fast path')
+    p.add_argument('--repeat', type=int, default=3, help='number of runs per case (best is reported)')
+    args = p.parse_args()
+
+    failed = False
+    print("%-20s %10s %12s  %s"%("case", "wall (ms)", "import (ms)", "result"))
+    for name, case_args in CASES:
+        runs = [run_case(case_args) for _ in range(args.repeat)]
+        elapsed, imports = min(runs, key=lambda run: sum(run[1].values()))
+        import_ms = sum(imports.values())/1000.0
+
+        problems = []
+        for module in FORBIDDEN:
+            if module in imports:
+                problems.append("imports %s"%(module))
+        if import_ms > args.budget_ms:
+            problems.append("over budget (%.0f ms)"%(args.budget_ms))
+        failed = failed or len(problems) > 0
+
+        result = "ok" if len(problems)==0 else "FAIL: " + ", ".join(problems)
+        print("%-20s %10.1f %12.1f  %s"%(name, 1000*elapsed, import_ms, result))
+
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,81 @@
+#!/usr/bin/env python
+"""
+Compare the wall time and peak memory of loading the game data
+by parsing everything and then filtering (read_json + DataFrame filters)
+against streaming the game data with the filters pushed down into the parser.
+
+Usage:
+    bench_loader.py
+    bench_loader.py --repeat 5
+"""
+import time
+import argparse
+import tracemalloc
+from interesting_blaseball_games.game_data import (
+    GameData,
+    build_games_frame,
+    stream_games_frame,
+)
+from interesting_blaseball_games.util import get_team_index
+from interesting_blaseball_games.datasource import get_games_data
+
+
+QUERIES = [
+    ("one team, one season", dict(season=['3'], postseason=False, team=['Sunbeams'])),
+    ("one team, all seasons", dict(season=['all'], postseason=False, team=['Sunbeams'])),
+    ("postseason, all teams", dict(season=['all'], postseason=True, team=None)),
+    ("everything", dict(season=['all'], postseason=False, team=None)),
+]
+
+
+def full_then_filter(query):
+    """The eager path: parse every game, then apply the data frame filters"""
+    gdata = GameData.__new__(GameData)
+    gdata.team_rows = None
+    gdata.df = build_games_frame()
+    gdata.df = gdata._season_filter_df(query['season'])
+    gdata.df = gdata._postseason_filter_df(query['postseason'])
+    gdata.df = gdata._team_filter_df(query['team'])
+    return gdata.df
+
+
+def streamed(query):
+    """The streaming path: filters are applied while parsing"""
+    return stream_games_frame(query['season'], query['postseason'], query['team'])
+
+
+def measure(func, query, repeat):
+    best = None
+    for _ in range(repeat):
+        tracemalloc.start()
+        t0 = time.perf_counter()
+        df = func(query)
+        elapsed = time.perf_counter() - t0
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        if best is None or elapsed < best[0]:
+            best = (elapsed, peak, len(df))
+    return best
+
+
+def main():
+    p = argparse.ArgumentParser()
+    p.add_argument('--repeat', type=int, default=3, help='number of runs per measurement (best is reported)')
+    args = p.parse_args()
+
+    # Read the raw data once so that both paths start from the same place
+    get_games_data()
+    all_teams = get_team_index().teams
+
+    print("%-24s %-18s %10s %12s %8s"%("query", "loader", "time (s)", "peak (MiB)", "rows"))
+    for name, query in QUERIES:
+        query = dict(query)
+        if query['team'] is None:
+            query['team'] = all_teams
+        for label, func in [("read_json+filter", full_then_filter), ("stream+pushdown", streamed)]:
+            elapsed, peak, nrows = measure(func, query, args.repeat)
+            print("%-24s %-18s %10.3f %12.1f %8d"%(name, label, elapsed, peak/2**20, nrows))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,170 @@
+#!/usr/bin/env python
+"""
+Benchmark each stage of interesting-blaseball-games on synthetic
+game histories that are 1x, 10x and 100x the size of the real one:
+
+* GameData construction (parsing the games JSON, and streaming it)
+* loading the season-partitioned cache (every season, and one season)
+* each GameData filter method (the team filter both as an isin
+  mask and with the inverted team index, for two teams, a division and a league)
+* each built-in reason (and the combined --reason all and --per-team evaluators)
+* RichView and MarkdownView rendering
+
+Usage:
+    benchmark.py
+    benchmark.py --scale 1 --scale 10 --json results.json
+    benchmark.py --compare results.json --threshold 1.25
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import tempfile
+import contextlib
+from synthetic_games import generate_games_json
+from interesting_blaseball_games.command import get_parser, process_options
+from interesting_blaseball_games.game_data import (
+    GameData,
+    all_reasons,
+    reason_top,
+    team_reasons,
+    build_games_frame,
+    stream_games_frame,
+)
+from interesting_blaseball_games.cache import GamesCache
+from interesting_blaseball_games.reasons import BUILTIN_REASONS
+from interesting_blaseball_games.team_rows import TeamRows
+from interesting_blaseball_games.util import get_team_index
+from interesting_blaseball_games.view import RichView, MarkdownView
+
+
+def make_options(args):
+    """Parse command line arguments the same way the tool does"""
+    return process_options(get_parser().parse_args(args))
+
+
+def timeit(func, repeat):
+    """Run func repeat times, return the best wall time in seconds"""
+    best = None
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        func()
+        elapsed = time.perf_counter() - t0
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def bench_scale(scale, repeat):
+    """
+    Benchmark every stage on a synthetic history of the given scale.
+    Returns: dict of stage name to best wall time in seconds
+    """
+    results = {}
+    games_json = generate_games_json(scale)
+    options = make_options(['--season', '1', '--team', 'Sunbeams', '-n', '10'])
+    all_options = make_options(['-n', '10'])
+
+    # GameData construction
+    results['load: read_json'] = timeit(lambda: build_games_frame(games_json), repeat)
+    results['load: stream (one team, one season)'] = timeit(
+        lambda: stream_games_frame(options.season, options.postseason, options.team, games_json=games_json),
+        repeat)
+    games = build_games_frame(games_json)
+    cache_dir = tempfile.mkdtemp(prefix="benchmark-cache-")
+    try:
+        cache = GamesCache(cache_dir)
+        cache.save(games)
+        results['load: cache (all seasons)'] = timeit(lambda: GamesCache(cache_dir).load(), repeat)
+        results['load: cache (one season)'] = timeit(lambda: GamesCache(cache_dir).load(seasons=[0]), repeat)
+    finally:
+        shutil.rmtree(cache_dir, ignore_errors=True)
+    results['GameData (preloaded)'] = timeit(lambda: GameData(all_options, games), repeat)
+
+    # Filters, each on the full frame
+    gdata = GameData(all_options, games)
+    full = gdata.df
+    def run_filter(method, arg):
+        gdata.df = full
+        method(arg)
+    results['filter: season'] = timeit(lambda: run_filter(gdata._season_filter_df, ['1']), repeat)
+    results['filter: postseason'] = timeit(lambda: run_filter(gdata._postseason_filter_df, True), repeat)
+    team_index = get_team_index()
+    team_lists = [
+        ('two teams', ['Sunbeams', 'Tigers']),
+        ('division', team_index.division_teams(team_index.divisions[0])),
+        ('league', team_index.league_teams(team_index.leagues[0])),
+    ]
+    results['team index: build'] = timeit(lambda: TeamRows.from_frame(full), repeat)
+    team_rows = TeamRows.from_frame(full)
+    for label, teams in team_lists:
+        gdata.team_rows = None
+        results['filter: team, %s (isin mask)'%(label)] = timeit(lambda: run_filter(gdata._team_filter_df, teams), repeat)
+        gdata.team_rows = team_rows
+        results['filter: team, %s (team index)'%(label)] = timeit(lambda: run_filter(gdata._team_filter_df, teams), repeat)
+    gdata.team_rows = None
+    gdata.df = full
+
+    # Reasons, each on the full frame
+    for reason in BUILTIN_REASONS:
+        results['reason: %s'%(reason.name)] = timeit(lambda: reason_top(full, reason, all_options.n_results), repeat)
+    results['reason: all (combined)'] = timeit(lambda: all_reasons(full, BUILTIN_REASONS, all_options.n_results), repeat)
+    results['reason: all, per team (one pass)'] = timeit(
+        lambda: team_reasons(full, all_options.team, BUILTIN_REASONS, all_options.n_results), repeat)
+
+    # Rendering all tables, output discarded
+    for name, view_class in [('RichView', RichView), ('MarkdownView', MarkdownView)]:
+        view = view_class(all_options, gdata)
+        with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+            results['render: %s'%(name)] = timeit(view.make_table, repeat)
+
+    return results
+
+
+def main():
+    p = argparse.ArgumentParser()
+    p.add_argument('--scale', type=float, action='append', help='history size as a multiple of the real history (repeat for several; default 1, 10, 100)')
+    p.add_argument('--repeat', type=int, default=3, help='number of runs per stage (best is reported)')
+    p.add_argument('--json', default=None, help='write results to this JSON file')
+    p.add_argument('--compare', default=None, help='compare against results in this JSON file')
+    p.add_argument('--threshold', type=float, default=1.25, help='slowdown ratio counted as a regression (with --compare)')
+    args = p.parse_args()
+
+    scales = args.scale or [1, 10, 100]
+    all_results = {}
+    for scale in scales:
+        all_results["%gx"%(scale)] = bench_scale(scale, args.repeat)
+
+    baseline = None
+    if args.compare:
+        with open(args.compare, 'r') as f:
+            baseline = json.load(f)
+
+    regressions = []
+    stages = list(all_results[list(all_results.keys())[0]].keys())
+    header = "%-44s"%("stage") + "".join("%12s"%(k) for k in all_results)
+    print(header)
+    for stage in stages:
+        line = "%-44s"%(stage)
+        for key, results in all_results.items():
+            line += "%11.4fs"%(results[stage])
+            if baseline is not None and stage in baseline.get(key, {}):
+                ratio = results[stage]/max(baseline[key][stage], 1e-9)
+                if ratio > args.threshold:
+                    regressions.append("%s @ %s: %.2fx slower"%(stage, key, ratio))
+        print(line)
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(all_results, f, indent=2)
+
+    if regressions:
+        print("\nRegressions:")
+        for r in regressions:
+            print("  " + r)
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
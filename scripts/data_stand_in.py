@@ -0,0 +1,126 @@
+#!/usr/bin/env python
+"""
+Stand-in for a game data source, for trying out (and testing)
+interesting-blaseball-games --refresh without a real data host.
+
+Serves /games.json and /teams.json, with ETag and Last-Modified
+headers, and answers conditional requests (If-None-Match and
+If-Modified-Since) with 304 Not Modified when the data has not changed.
+The games start as the game history in blaseball_core_game_data; with
+--add-day, a day of synthetic games (after the last season) is added
+every few seconds, so each refresh finds new data.
+
+Usage:
+    data_stand_in.py --port 8091
+    data_stand_in.py --port 8091 --add-day 10
+    interesting-blaseball-games --refresh --refresh-source http://127.0.0.1:8091
+"""
+import sys
+import json
+import time
+import hashlib
+import argparse
+import threading
+from email.utils import formatdate, parsedate_to_datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import blaseball_core_game_data as gd
+from live_stand_in import generate_days
+
+
+class DataSet(object):
+    """The JSON documents being served, with their ETag and Last-Modified date"""
+    def __init__(self, games, teams_json):
+        self.lock = threading.Lock()
+        self.games = games
+        self.documents = {}
+        self.set('/teams.json', teams_json)
+        self.set('/games.json', json.dumps(self.games))
+
+    def set(self, path, text):
+        body = text.encode('utf-8')
+        etag = '"%s"'%(hashlib.sha256(body).hexdigest()[:32])
+        # Last-Modified has a resolution of one second
+        with self.lock:
+            self.documents[path] = (body, etag, formatdate(int(time.time()), usegmt=True))
+
+    def get(self, path):
+        with self.lock:
+            return self.documents.get(path)
+
+    def add_games(self, games):
+        self.games = self.games + games
+        self.set('/games.json', json.dumps(self.games))
+
+
+def make_handler(data):
+
+    class DataHandler(BaseHTTPRequestHandler):
+        """Serves the data documents, honoring conditional requests"""
+        def do_GET(self):
+            document = data.get(self.path.split('?')[0])
+            if document is None:
+                self.send_error(404)
+                return
+            body, etag, last_modified = document
+            if self.not_modified(etag, last_modified):
+                self.send_response(304)
+                self.send_header('ETag', etag)
+                self.send_header('Last-Modified', last_modified)
+                self.end_headers()
+                return
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.send_header('ETag', etag)
+            self.send_header('Last-Modified', last_modified)
+            self.end_headers()
+            self.wfile.write(body)
+
+        def not_modified(self, etag, last_modified):
+            # If-None-Match takes precedence over If-Modified-Since
+            if_none_match = self.headers.get('If-None-Match')
+            if if_none_match is not None:
+                return etag in [t.strip() for t in if_none_match.split(',')]
+            if_modified_since = self.headers.get('If-Modified-Since')
+            if if_modified_since is not None:
+                try:
+                    return parsedate_to_datetime(last_modified) <= parsedate_to_datetime(if_modified_since)
+                except (TypeError, ValueError):
+                    return False
+            return False
+
+    return DataHandler
+
+
+def add_days(data, days, interval):
+    """Add one day of games every interval seconds"""
+    for games in days:
+        time.sleep(interval)
+        data.add_games(games)
+        print("Added %d games (season %d, day %d)"%(len(games), games[0]['season'] + 1, games[0]['day'] + 1), file=sys.stderr)
+
+
+def main():
+    p = argparse.ArgumentParser()
+    p.add_argument('--host', default='127.0.0.1', help='address to listen on')
+    p.add_argument('--port', type=int, default=8091, help='port to listen on')
+    p.add_argument('--add-day', type=float, default=None, help='add a day of synthetic games every this many seconds')
+    p.add_argument('--days', type=int, default=20, help='number of days of games to add (with --add-day)')
+    p.add_argument('--seed', type=int, default=0, help='random seed')
+    args = p.parse_args()
+
+    data = DataSet(json.loads(gd.get_games_data()), gd.get_teams_data())
+    if args.add_day:
+        days = generate_days(args.days, args.seed)
+        threading.Thread(target=add_days, args=(data, days, args.add_day), daemon=True).start()
+
+    server = ThreadingHTTPServer((args.host, args.port), make_handler(data))
+    print("Serving game data at http://%s:%d (games.json, teams.json)"%(args.host, args.port))
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,120 @@
+#!/usr/bin/env python
+"""
+Stand-in for the live Blaseball game feed, for trying out (and testing)
+interesting-blaseball-games --live without the real game servers.
+
+Serves a server-sent events stream at /events/streamData. Each message
+has the streamData layout ({"value": {"games": {"schedule": [...]}}}) and
+holds one day of synthetic games, first in progress and then completed.
+The games come after the last season of the real game history.
+
+Usage:
+    live_stand_in.py --port 8090 --days 20 --interval 1
+    interesting-blaseball-games --live http://127.0.0.1:8090/events/streamData --reason blowout
+"""
+import time
+import json
+import random
+import argparse
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from synthetic_games import real_history, make_game, REGULAR_DAYS, POSTSEASON_DAYS
+from interesting_blaseball_games.loader import iter_games
+from interesting_blaseball_games.datasource import get_games_data
+
+
+# Fields of a game record that are not part of a live game update
+RECORD_ONLY_PREFIXES = ('winning', 'losing')
+RECORD_ONLY_FIELDS = ['runDiff']
+
+
+def live_update(game, complete):
+    """Turn a synthetic game record into a live game update"""
+    update = dict((k, v) for k, v in game.items()
+                  if not k.startswith(RECORD_ONLY_PREFIXES) and k not in RECORD_ONLY_FIELDS)
+    update['gameComplete'] = complete
+    if not complete:
+        # Partial scores while the game is in progress
+        update['homeScore'] = game['homeScore']//2
+        update['awayScore'] = game['awayScore']//2
+    return update
+
+
+def generate_days(ndays, seed=0):
+    """
+    Generate ndays of synthetic games, starting the season after
+    the last season in the real game history.
+    Returns: list of lists of game records (one list per day)
+    """
+    rng = random.Random(seed)
+    _, template, teams, pitchers = real_history()
+    season = max(g['season'] for g in iter_games(get_games_data())) + 1
+    nicknames = sorted(teams.keys())
+
+    days = []
+    for i in range(ndays):
+        day = i % (REGULAR_DAYS + POSTSEASON_DAYS)
+        playing = nicknames[:]
+        rng.shuffle(playing)
+        games = []
+        for h, a in zip(playing[::2], playing[1::2]):
+            home_pitcher = rng.choice(pitchers.get(h, ["Pitcher"]))
+            away_pitcher = rng.choice(pitchers.get(a, ["Pitcher"]))
+            games.append(make_game(rng, template, season + i//(REGULAR_DAYS + POSTSEASON_DAYS), day,
+                                   teams[h], teams[a], home_pitcher, away_pitcher))
+        days.append(games)
+    return days
+
+
+def make_handler(days, interval):
+
+    class StreamHandler(BaseHTTPRequestHandler):
+        """Sends every day of games to each client, then keeps the connection open"""
+        def do_GET(self):
+            if self.path.split('?')[0] != '/events/streamData':
+                self.send_error(404)
+                return
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/event-stream')
+            self.send_header('Cache-Control', 'no-cache')
+            self.end_headers()
+            try:
+                for games in days:
+                    for complete in [False, True]:
+                        self.send_event([live_update(g, complete) for g in games])
+                        time.sleep(interval)
+                while True:
+                    # Comment lines keep the connection alive
+                    self.wfile.write(b": keepalive\n\n")
+                    self.wfile.flush()
+                    time.sleep(max(interval, 1))
+            except (BrokenPipeError, ConnectionResetError):
+                pass
+
+        def send_event(self, schedule):
+            data = json.dumps({'value': {'games': {'schedule': schedule}}})
+            self.wfile.write(("data: %s\n\n"%(data)).encode('utf-8'))
+            self.wfile.flush()
+
+    return StreamHandler
+
+
+def main():
+    p = argparse.ArgumentParser()
+    p.add_argument('--host', default='127.0.0.1', help='address to listen on')
+    p.add_argument('--port', type=int, default=8090, help='port to listen on')
+    p.add_argument('--days', type=int, default=20, help='number of days of games to send')
+    p.add_argument('--interval', type=float, default=1.0, help='seconds between messages')
+    p.add_argument('--seed', type=int, default=0, help='random seed')
+    args = p.parse_args()
+
+    days = generate_days(args.days, args.seed)
+    server = ThreadingHTTPServer((args.host, args.port), make_handler(days, args.interval))
+    print("Serving live game feed at http://%s:%d/events/streamData"%(args.host, args.port))
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,95 @@
+#!/usr/bin/env python
+"""
+Load test for the interesting-blaseball-games query server.
+
+Start a server first:
+    interesting-blaseball-games --serve --port 8080
+    interesting-blaseball-games --serve --socket /tmp/ibg.sock
+
+Then send it queries from several threads at once:
+    load_test.py --url http://127.0.0.1:8080 --requests 500 --concurrency 16
+    load_test.py --socket /tmp/ibg.sock --query "reason=shame&team=Sunbeams&format=markdown"
+"""
+import time
+import socket
+import argparse
+import http.client
+from urllib.parse import urlparse
+from concurrent.futures import ThreadPoolExecutor
+
+
+DEFAULT_QUERIES = [
+    "reason=all",
+    "reason=blowout&season=3",
+    "reason=shame&team=Sunbeams&format=markdown",
+    "reason=underdog&league=Good&n-results=20",
+    "reason=maxedout&postseason&name-style=emoji",
+]
+
+
+class UnixHTTPConnection(http.client.HTTPConnection):
+    """HTTP connection over a Unix socket"""
+    def __init__(self, path, timeout=60):
+        super().__init__('localhost', timeout=timeout)
+        self.socket_path = path
+
+    def connect(self):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.settimeout(self.timeout)
+        self.sock.connect(self.socket_path)
+
+
+def make_connection(args):
+    if args.socket:
+        return UnixHTTPConnection(args.socket)
+    url = urlparse(args.url)
+    return http.client.HTTPConnection(url.hostname, url.port or 80, timeout=60)
+
+
+def one_request(args, query):
+    conn = make_connection(args)
+    t0 = time.perf_counter()
+    try:
+        conn.request('GET', '/query?' + query)
+        response = conn.getresponse()
+        response.read()
+        status = response.status
+    finally:
+        conn.close()
+    return (status, time.perf_counter() - t0)
+
+
+def percentile(values, pct):
+    values = sorted(values)
+    return values[min(len(values)-1, int(round(pct/100.0*(len(values)-1))))]
+
+
+def main():
+    p = argparse.ArgumentParser()
+    p.add_argument('--url', default='http://127.0.0.1:8080', help='base URL of the query server')
+    p.add_argument('--socket', default=None, help='Unix socket path of the query server (instead of --url)')
+    p.add_argument('--requests', type=int, default=200, help='total number of requests to send')
+    p.add_argument('--concurrency', type=int, default=8, help='number of concurrent clients')
+    p.add_argument('--query', action='append', help='query string to send (repeat for several; cycles through them)')
+    args = p.parse_args()
+
+    queries = args.query or DEFAULT_QUERIES
+    work = [queries[i % len(queries)] for i in range(args.requests)]
+
+    t0 = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+        results = list(pool.map(lambda q: one_request(args, q), work))
+    elapsed = time.perf_counter() - t0
+
+    latencies = [lat for _, lat in results]
+    errors = sum(1 for status, _ in results if status != 200)
+    print("requests:     %d (%d errors)"%(len(results), errors))
+    print("concurrency:  %d"%(args.concurrency))
+    print("elapsed:      %.2f s"%(elapsed))
+    print("throughput:   %.1f requests/s"%(len(results)/elapsed))
+    for pct in [50, 90, 99]:
+        print("latency p%d:  %.1f ms"%(pct, 1000*percentile(latencies, pct)))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,128 @@
+#!/usr/bin/env python
+"""
+Generate a synthetic game history with the same schema as
+blaseball_core_game_data's get_games_data(), scaled to a multiple
+of the size of the real history.
+
+Each synthetic game starts from a copy of a real game record, so every
+field in the real data is present. The fields this tool uses (season,
+day, teams, pitchers, scores, odds, shame, and the derived winning/losing
+fields) are overwritten with random but consistent values.
+
+Usage:
+    synthetic_games.py --scale 10 > games_10x.json
+"""
+import sys
+import json
+import random
+import argparse
+import blaseball_core_game_data as gd
+from interesting_blaseball_games.loader import iter_games
+
+
+# Days in a synthetic regular season, and postseason days after that
+REGULAR_DAYS = 99
+POSTSEASON_DAYS = 12
+
+
+def real_history():
+    """
+    Summarize the real game history.
+    Returns: tuple (number of games, template game record,
+    dict of team nickname to dict of team fields, dict of team nickname to list of pitcher names)
+    """
+    ngames = 0
+    template = None
+    teams = {}
+    pitchers = {}
+    for game in iter_games(gd.get_games_data()):
+        ngames += 1
+        if template is None:
+            template = game
+        for side in ['home', 'away']:
+            nickname = game[side + 'TeamNickname']
+            teams.setdefault(nickname, {
+                'TeamName': game[side + 'TeamName'],
+                'TeamNickname': nickname,
+                'TeamEmoji': game[side + 'TeamEmoji'],
+            })
+            pitcher = game.get(side + 'PitcherName')
+            if pitcher is not None:
+                pitchers.setdefault(nickname, set()).add(pitcher)
+    pitchers = dict((k, sorted(v)) for k, v in pitchers.items())
+    return (ngames, template, teams, pitchers)
+
+
+def make_game(rng, template, season, day, home, away, home_pitcher, away_pitcher):
+    """Create one synthetic game record from the template record"""
+    game = dict(template)
+    game['id'] = "synthetic-%d-%d-%s-%s"%(season, day, home['TeamNickname'], away['TeamNickname'])
+    game['season'] = season
+    game['day'] = day
+    game['isPostseason'] = day >= REGULAR_DAYS
+
+    # Scores, with the occasional blowout
+    home_score = min(int(rng.expovariate(0.2)), 25)
+    away_score = min(int(rng.expovariate(0.2)), 25)
+    home_odds = round(rng.uniform(0.3, 0.7), 4)
+
+    home_fields = dict(home, PitcherName=home_pitcher, Score=home_score, Odds=home_odds)
+    away_fields = dict(away, PitcherName=away_pitcher, Score=away_score, Odds=round(1 - home_odds, 4))
+    for k in home_fields:
+        game['home' + k] = home_fields[k]
+        game['away' + k] = away_fields[k]
+
+    winner, loser = (home_fields, away_fields) if home_score >= away_score else (away_fields, home_fields)
+    for k in winner:
+        game['winning' + k] = winner[k]
+        game['losing' + k] = loser[k]
+    game['runDiff'] = abs(home_score - away_score)
+    game['shame'] = game['runDiff'] > 0 and loser is away_fields and rng.random() < 0.1
+    return game
+
+
+def generate_games(scale=1.0, seed=0):
+    """
+    Generate a synthetic game history scale times the size
+    of the real history. Returns: list of game records
+    """
+    rng = random.Random(seed)
+    ngames, template, teams, pitchers = real_history()
+    target = int(round(scale*ngames))
+    nicknames = sorted(teams.keys())
+
+    games = []
+    season = 0
+    while len(games) < target:
+        for day in range(REGULAR_DAYS + POSTSEASON_DAYS):
+            if day >= REGULAR_DAYS:
+                # Fewer teams play in the postseason
+                playing = rng.sample(nicknames, max(2, len(nicknames)//4))
+            else:
+                playing = nicknames[:]
+            rng.shuffle(playing)
+            for h, a in zip(playing[::2], playing[1::2]):
+                home_pitcher = rng.choice(pitchers.get(h, ["Pitcher"]))
+                away_pitcher = rng.choice(pitchers.get(a, ["Pitcher"]))
+                games.append(make_game(rng, template, season, day, teams[h], teams[a], home_pitcher, away_pitcher))
+                if len(games) >= target:
+                    return games
+        season += 1
+    return games
+
+
+def generate_games_json(scale=1.0, seed=0):
+    """Generate a synthetic game history as a JSON string (like get_games_data())"""
+    return json.dumps(generate_games(scale, seed))
+
+
+def main():
+    p = argparse.ArgumentParser()
+    p.add_argument('--scale', type=float, default=1.0, help='size of the history, as a multiple of the real history size')
+    p.add_argument('--seed', type=int, default=0, help='random seed')
+    args = p.parse_args()
+    sys.stdout.write(generate_games_json(args.scale, args.seed))
+
+
+if __name__ == '__main__':
+    main()